@@ -1,8 +1,210 @@
 import json
+import math
 import content
+from io import BytesIO
 import streamlit as st
 import helpers as sth
-from streamlit_autorefresh import st_autorefresh
+from scheduler.instances import InvalidInstanceError, parse_jobs
+
+# Number of experiments displayed on a single page of the results
+EXPERIMENTS_PER_PAGE = 5
+
+# How often statuses of unfinished scenarios are refreshed
+STATUS_REFRESH_INTERVAL_IN_SECS = 5
+
+
+# -- [ Views ] ---
+def render_scenario_status(scenario):
+    queue_position = st.session_state.scheduler.get_queue_position(scenario)
+    st.markdown(sth.get_status_text(scenario, queue_position),
+                help=sth.get_status_help(scenario, queue_position))
+
+
+@st.fragment(run_every=STATUS_REFRESH_INTERVAL_IN_SECS)
+def render_live_scenario_status(scenario):
+    """ Status of an unfinished scenario. It's refreshed on its own from the
+        state kept by the scheduler's poller (nothing else is re-rendered).
+    """
+    render_scenario_status(scenario)
+
+    # Note: Charts and buttons of the experiment depend on finished scenarios
+    if scenario.status >= 4:
+        st.rerun()
+
+
+@st.fragment
+def render_experiment(experiment):
+    """ Interactions with an experiment (e.g. selecting a chart) re-render
+        only this experiment
+    """
+    st.header(f"Experiment: :orange[{experiment.experiment_name}]", divider=True)
+    st.markdown("##### Scenarios:")
+
+    with st.container(border=True):
+        for scenario in experiment.scenarios:
+            columns = st.columns([0.25, 0.1, 0.13, 0.13, 0.13, 0.13, 0.13])
+            with columns[0]:
+                st.markdown(scenario.scenario_name, help=sth.get_scenario_help(scenario))
+
+            with columns[1]:
+                if scenario.status >= 4:
+                    render_scenario_status(scenario)
+                else:
+                    render_live_scenario_status(scenario)
+
+            with columns[2]:
+                with st.popover("Parameters", use_container_width=True):
+                    st.code(json.dumps(scenario.params, indent=4))
+
+            with columns[3]:
+                url = st.session_state.scheduler.get_artifacts_url(scenario)
+                st.link_button("Artifacts", url, use_container_width=True)
+
+            with columns[4]:
+                url = st.session_state.scheduler.get_logs_url(scenario)
+                st.link_button("Logs", url, use_container_width=True,
+                            disabled=scenario.status < 3 or scenario.reused_from is not None)
+
+            with columns[5]:
+                with st.popover("Metrics", use_container_width=True,
+                                disabled=scenario.status != 4):
+                    st.code(json.dumps(scenario.metrics, indent=4))
+
+            with columns[6]:
+                if st.button("Cancel", use_container_width=True, disabled=scenario.status >= 4,
+                             key=f"cancel_btn_{experiment.experiment_name}_{scenario.scenario_name}"):
+                    st.session_state.scheduler.cancel_scenario(experiment, scenario)
+                    st.rerun(scope="fragment")
+
+    st.markdown("##### Charts:")
+    gantt_col, radar_col = st.columns(2)
+
+    with gantt_col:
+        with st.expander("Review Gantt charts"):
+            options = [scenario.scenario_name for scenario in experiment.scenarios
+                    if scenario.status == 4]
+
+            if len(options):
+                selected_scenario_name = st.selectbox("Choose one of the scenarios", options,
+                                                    key=f"select_{experiment.experiment_name}")
+
+                selected_scenario = None
+                for scenario in experiment.scenarios:
+                    if scenario.scenario_name == selected_scenario_name:
+                        selected_scenario = scenario
+                        break
+
+                if selected_scenario is None:
+                    st.warning("Technical error. Cannot find scenario by name.")
+                else:
+                    if len(selected_scenario.metrics) == 0:
+                        st.warning(
+                            "There are no results for this scenario! "
+                            "Probably there are no feasible solution for the given parameters."
+                        )
+                    else:
+                        scheduler = st.session_state.scheduler
+                        key = f"{experiment.experiment_name}_{selected_scenario.scenario_name}"
+
+                        # Note: The overview is built from a small summary; all the
+                        #       tasks are downloaded only if they're requested.
+                        overview = scheduler.render_overview_chart(selected_scenario)
+                        show_tasks = True
+                        if overview is not None:
+                            st.plotly_chart(overview, use_container_width=True)
+                            with st.popover("Jobs' completion", use_container_width=True):
+                                summary = scheduler.get_summary(selected_scenario)
+                                num_jobs = summary.get("num_jobs", len(summary["jobs"]))
+                                if num_jobs > len(summary["jobs"]):
+                                    st.caption(f"{len(summary['jobs'])} jobs that finish last "
+                                               f"(out of {num_jobs})")
+                                st.dataframe(summary["jobs"],
+                                             hide_index=True, use_container_width=True)
+                            show_tasks = st.toggle("Show all tasks", key=f"tasks_{key}")
+
+                        if show_tasks:
+                            dimensions = scheduler.get_gantt_dimensions(selected_scenario)
+
+                            machines_col, jobs_col = st.columns(2)
+                            with machines_col:
+                                machines = st.multiselect("Machines", dimensions["machines"],
+                                                          placeholder="All machines",
+                                                          key=f"machines_{key}")
+                            with jobs_col:
+                                jobs = st.multiselect("Jobs", dimensions["jobs"],
+                                                      placeholder="All jobs",
+                                                      key=f"jobs_{key}")
+
+                            start, finish = dimensions["start"].date(), dimensions["finish"].date()
+                            time_window = None
+                            if start < finish:
+                                time_window = st.slider("Time window", min_value=start,
+                                                        max_value=finish, value=(start, finish),
+                                                        key=f"window_{key}")
+                                # Note: The full time span is the default (cached) view
+                                if time_window == (start, finish):
+                                    time_window = None
+
+                            st.plotly_chart(scheduler.render_gantt_chart(
+                                selected_scenario, machines=machines, jobs=jobs,
+                                time_window=time_window), use_container_width=True)
+            else:
+                st.info("There are no finished scenarios.")
+
+    with radar_col:
+        with st.expander("Compare all plans on a radar plot"):
+
+            if experiment.status != 4:
+                st.warning("Scenarios that are still running or have failed won't be displayed.")
+
+            statuses = [len(scenario.metrics) == 0 and experiment.status == 4
+                for scenario in experiment.scenarios]
+
+            if all(statuses):
+                st.warning("Cannot find feasible solution for the given problem.")
+            else:
+                st.plotly_chart(st.session_state.scheduler.render_radar_plot(experiment))
+
+    with st.expander("Where does the time go?"):
+        summary = st.session_state.scheduler.get_timings_summary(experiment)
+        if len(summary):
+            st.dataframe(summary, use_container_width=True, hide_index=True)
+            st.plotly_chart(st.session_state.scheduler.render_timings_breakdown(experiment),
+                            use_container_width=True)
+        else:
+            st.info("There are no timings yet.")
+
+    export_col, delete_col = st.columns([0.8, 0.2])
+
+    with export_col:
+        key = f"{experiment.experiment_name}_{experiment.created_at.isoformat()}"
+        format_col, export_btn_col, download_col = st.columns(3)
+        with format_col:
+            export_format = st.selectbox("Format", ["zip", "parquet"], key=f"export_format_{key}",
+                                         label_visibility="collapsed")
+        with export_btn_col:
+            if st.button("Export", key=f"export_btn_{key}", use_container_width=True):
+                with st.spinner("Exporting ..."):
+                    st.session_state[f"export_url_{key}"] = \
+                        st.session_state.scheduler.export_experiment(experiment, export_format)
+        with download_col:
+            export_url = st.session_state.get(f"export_url_{key}")
+            if export_url is not None:
+                st.link_button("Download", export_url, use_container_width=True)
+
+    with delete_col:
+        with st.popover("Delete", use_container_width=True):
+            st.caption("Unfinished scenarios will be cancelled.")
+            delete_files = st.checkbox("Delete files too", key=f"delete_files_{key}",
+                                       help="Results of this experiment won't be reused anymore.")
+            if st.button("Confirm", key=f"delete_btn_{experiment.experiment_name}",
+                         use_container_width=True, type="primary"):
+                with st.spinner("Deleting ..."):
+                    st.session_state.scheduler.delete_experiment(experiment, delete_files)
+                st.rerun()
+
+    st.markdown("##")
+
 
 # -- [ Pre-work ] ---
 st.set_page_config(page_title="Factory Schedules Optimizer / F33.ai", layout="wide")
@@ -36,14 +238,16 @@ else:
 
     st.write("##")
 
-    if not st.session_state.scheduler_image_exists:
-        if st.session_state.scheduler.check_if_scheduler_image_exists():
-            st.session_state.scheduler_image_exists = True
-        else:
-            with st.spinner("Preparing solver code ..."):
-                sth.centered_caption("It's one-time only operation. It should take no more than a few minutes.")
-                st.session_state.scheduler.build_scheduler_container()
-                st.rerun()
+    with st.spinner("Connecting to Google Cloud ..."):
+        sth.attach_scheduler(st.session_state)
+
+    # Note: The image is tagged with the solver's version, so it's built once
+    #       per version (the check is remembered by the shared scheduler).
+    if not st.session_state.scheduler.check_if_scheduler_image_exists():
+        with st.spinner("Preparing solver code ..."):
+            sth.centered_caption("It's one-time only operation. It should take no more than a few minutes.")
+            st.session_state.scheduler.build_scheduler_container()
+            st.rerun()
 
     create_a_new_experiment, check_results = st.tabs(
         ["Create a new experiment", "Check results"]
@@ -54,13 +258,20 @@ else:
     # -------------------------------
     with create_a_new_experiment:
 
+        # Note: The scheduler's package is loaded after logging in
+        from scheduler import ExperimentExistsError
+
         if st.session_state.new_experiment_kwargs:
             with st.spinner("Creating a new experiment ..."):
                 kwargs = st.session_state.new_experiment_kwargs
-                st.session_state.scheduler.run_experiment(**kwargs)
                 st.session_state.new_experiment_kwargs = {}
-                st.session_state.new_experiment_suggested_name = \
-                    st.session_state.scheduler.get_random_name()
+                try:
+                    st.session_state.scheduler.run_experiment(**kwargs)
+                    st.session_state.new_experiment_suggested_name = \
+                        st.session_state.scheduler.get_random_name()
+                except ExperimentExistsError as error:
+                    # Note: Another session could take the name in the meantime
+                    st.error(f"{error}. Please choose another name.")
 
         with st.form("New experiment", clear_on_submit=True,
                     border=False):
@@ -70,6 +281,9 @@ else:
             exp_name = st.text_input("Experiment name:",
                                     value=st.session_state.new_experiment_suggested_name,
                                     placeholder="Use a meaningful name for your experiment...")
+            priority = st.number_input("Priority:", value=0, step=1,
+                                       help="Experiments with a higher priority are run first "
+                                            "when the Batch quota is used up.")
 
 
             jobs_json_col, scenarios_json_col = st.columns(2)
@@ -105,20 +319,31 @@ else:
 
                 with st.spinner("Creating a new experiment ..."):
                     try:
-                        b_jobs = jobs_json_file.getvalue() if not st.session_state.key_use_example_jobs else \
-                            str.encode(content.JOBS_EXAMPLE)
+                        if st.session_state.scheduler.has_experiment(exp_name):
+                            raise ExperimentExistsError(exp_name)
+                        jobs_stream = jobs_json_file if not st.session_state.key_use_example_jobs else \
+                            BytesIO(str.encode(content.JOBS_EXAMPLE))
+                        # Note: Invalid files are rejected here (not minutes later by the solver)
+                        jobs_stream.seek(0)
+                        b_jobs, instance = parse_jobs(jobs_stream)
                         b_scenarios = scenarios_csv_file.getvalue() if not st.session_state.key_use_example_scenario else \
                             str.encode(content.SCENARIOS_EXAMPLE)
 
                         st.session_state.new_experiment_kwargs = dict(
                             experiment_name=exp_name,
                             jobs=b_jobs,
-                            scenarios=b_scenarios
+                            scenarios=b_scenarios,
+                            priority=int(priority),
+                            instance=instance
                         )
                         st.rerun()
 
                     except AttributeError:
                         st.warning("Please provide input files (or use examples) to run the experiment.")
+                    except InvalidInstanceError as error:
+                        st.error(f"The jobs file is invalid: {error}")
+                    except ExperimentExistsError as error:
+                        st.error(f"{error}. Please choose another name.")
 
 
     # -------------------------------
@@ -132,95 +357,30 @@ else:
         if len(st.session_state.scheduler.experiments) == 0:
             st.info("Please create an experiment first.")
         else:
-            for experiment in st.session_state.scheduler.experiments[::-1]:
-
-                st.header(f"Experiment: :orange[{experiment.experiment_name}]", divider=True)
-                st.markdown("##### Scenarios:")
-
-                with st.container(border=True):
-                    for scenario in experiment.scenarios:
-                        status_text = sth.map_job_status_to_text(scenario.status)
-                        help_text = sth.map_job_status_to_help(scenario.status)
-                        columns = st.columns([0.3, 0.1, 0.15, 0.15, 0.15, 0.15])
-                        items = [
-                            (st.markdown, scenario.scenario_name, {"help": f"JobID: {scenario.batch_job_name}"}),
-                            (st.markdown, status_text, {"help": help_text}),
-                        ]
-                        for column, (method, param, kwargs) in zip(columns[:2], items):
-                            with column:
-                                method(param, **kwargs)
-
-                        with columns[2]:
-                            with st.popover("Parameters", use_container_width=True):
-                                st.code(json.dumps(scenario.params, indent=4))
-
-                        with columns[3]:
-                            url = st.session_state.scheduler.get_artifacts_url(scenario)
-                            st.link_button("Artifacts", url, use_container_width=True)
-
-                        with columns[4]:
-                            url = st.session_state.scheduler.get_logs_url(scenario)
-                            st.link_button("Logs", url, use_container_width=True,
-                                        disabled=scenario.status < 3)
-
-                        with columns[5]:
-                            with st.popover("Metrics", use_container_width=True,
-                                            disabled=scenario.status != 4):
-                                st.code(json.dumps(scenario.metrics, indent=4))
-
-                st.markdown("##### Charts:")
-                gantt_col, radar_col = st.columns(2)
-
-                with gantt_col:
-                    with st.expander("Review Gantt charts"):
-                        options = [scenario.scenario_name for scenario in experiment.scenarios
-                                if scenario.status == 4]
-
-                        if len(options):
-                            selected_scenario_name = st.selectbox("Choose one of the scenarios", options,
-                                                                key=f"select_{experiment.experiment_name}")
-
-                            selected_scenario = None
-                            for scenario in experiment.scenarios:
-                                if scenario.scenario_name == selected_scenario_name:
-                                    selected_scenario = scenario
-                                    break
-
-                            if selected_scenario is None:
-                                st.warning("Technical error. Cannot find scenario by name.")
-                            else:
-                                if len(selected_scenario.results) == 0:
-                                    st.warning(
-                                        "There are no results for this scenario! "
-                                        "Probably there are no feasible solution for the given parameters."
-                                    )
-                                else:
-                                    st.plotly_chart(st.session_state.scheduler.render_gantt_chart(selected_scenario))
-                        else:
-                            st.info("There are no finished scenarios.")
-
-                with radar_col:
-                    with st.expander("Compare all plans on a radar plot"):
-
-                        if experiment.status != 4:
-                            st.warning("Scenarios that are still running or have failed won't be displayed.")
-
-                        statuses = [len(scenario.results) == 0 and experiment.status == 4
-                            for scenario in experiment.scenarios]
-
-                        if all(statuses):
-                            st.warning("Cannot find feasible solution for the given problem.")
-                        else:
-                            st.plotly_chart(st.session_state.scheduler.render_radar_plot(experiment))
-
-                export_col, delete_col = st.columns([0.8, 0.2])
-
-                with delete_col:
-                    if st.button("Delete", key=f"delete_btn_{experiment.experiment_name}",
-                                use_container_width=True):
-                        st.session_state.scheduler.delete_experiment(experiment)
-                        st.rerun()
-
-                st.markdown("##")
+            experiments = st.session_state.scheduler.experiments[::-1]
+            num_pages = max(1, math.ceil(len(experiments) / EXPERIMENTS_PER_PAGE))
+            page = min(st.session_state.get("results_page", 0), num_pages - 1)
+
+            first = page * EXPERIMENTS_PER_PAGE
+            for experiment in experiments[first:first + EXPERIMENTS_PER_PAGE]:
+                render_experiment(experiment)
+
+            newer_col, page_col, older_col = st.columns([0.2, 0.6, 0.2])
+            with newer_col:
+                if st.button("Newer", use_container_width=True, disabled=page == 0):
+                    st.session_state.results_page = page - 1
+                    st.rerun()
+            with page_col:
+                sth.centered_caption(f"Page {page + 1} / {num_pages}")
+            with older_col:
+                if st.button("Older", use_container_width=True, disabled=page == num_pages - 1):
+                    st.session_state.results_page = page + 1
+                    st.rerun()
+
+        if st.session_state.scheduler.has_more_experiments:
+            if st.button("Load older experiments", use_container_width=True):
+                with st.spinner("Loading experiments ..."):
+                    st.session_state.scheduler.load_more_experiments()
+                st.rerun()
 
     sth.centered_caption("Created by <a href='https://f33.ai'>F33.AI</a> | 2024")
@@ -6,7 +6,7 @@ from pathlib import Path
 import streamlit as st
 import streamlit_authenticator as stauth
 from streamlit_authenticator.utilities.hasher import Hasher
-from scheduler import Scheduler
+from scheduler.names import get_random_name
 
 CONFIG_PATH = "config.yaml"
 DATASTORE_ENTITY_NAME = "f33-solutions-scheduler"
@@ -27,11 +27,70 @@ def read_yaml_file(path):
         return yaml.load(file, Loader=yaml.loader.SafeLoader)
 
 
+@st.cache_resource
+def load_config() -> dict:
+    """ Reads the config once per process """
+    if not Path(CONFIG_PATH).exists():
+        print("*** CANNOT LOAD THE CONFIG FILE. EXITING ...***")
+        exit(1)
+    return read_yaml_file(CONFIG_PATH)
+
+
+@st.cache_resource
+def get_password_hash(password: str) -> str:
+    """ bcrypt is slow by design, so the password is hashed once per process """
+    return Hasher([password]).generate()[0]
+
+
+@st.cache_resource
+def get_scheduler():
+    """ A single scheduler (GCP clients, caches and the poller thread) is
+        shared by all sessions served by this process
+    """
+    # Note: The scheduler pulls in pandas and GCP client libraries, so it's
+    #       imported only when it's needed (after logging in).
+    from scheduler import Scheduler
+    from scheduler.cache import get_shared_results_cache
+
+    parameters = load_config()
+    results_cache = get_shared_results_cache(
+        max_size_bytes=parameters.get("results_cache_size_mb", 256) * 1024 ** 2,
+        spill_dir=parameters.get("results_cache_spill_dir")
+    )
+    figures_cache = get_shared_results_cache(
+        max_size_bytes=parameters.get("figures_cache_size_mb", 64) * 1024 ** 2,
+        name="figures"
+    )
+    return Scheduler(
+        project_id=parameters["project_id"],
+        region=parameters["region"],
+        bucket_name=parameters["bucket_name"],
+        entity_name=DATASTORE_ENTITY_NAME,
+        artifacts_repository_name=parameters["artifacts_repository_name"],
+        batch_machine_type=parameters.get("batch_machine_type", "e2-standard-2"),
+        results_cache=results_cache,
+        figures_cache=figures_cache,
+        batch_max_running_jobs=parameters.get("batch_max_running_jobs"),
+        batch_max_vcpus=parameters.get("batch_max_vcpus"),
+        batch_auto_sizing=parameters.get("batch_auto_sizing", False),
+        batch_task_max_duration=parameters.get("batch_task_max_duration", 3600),
+        batch_array_jobs=parameters.get("batch_array_jobs", False),
+        batch_portfolio_size=parameters.get("batch_portfolio_size", 1),
+        batch_spot_vms=parameters.get("batch_spot_vms", False),
+        batch_pool_size=parameters.get("batch_pool_size", 0),
+        batch_pool_max_variables=parameters.get("batch_pool_max_variables", 20000),
+        batch_pool_idle_timeout=parameters.get("batch_pool_idle_timeout", 600)
+    )
+
+
 def start_session(session, force: bool = False):
     """ It defines a few basic values that sits in the session. The session
         is unique for every visitor. Similar to `gr.State()` but
         created automatically for each visitor.
 
+        Note: Everything that is expensive to create (the config, the password
+              hash, the scheduler) is created once per process and shared.
+
     Args:
         session (st.session_state): A dictionary that stores values
         force (bool): A flag to force a new session to be created
@@ -39,15 +98,11 @@ def start_session(session, force: bool = False):
 
     if force or not session.get("session_id", False):
 
-        if not Path(CONFIG_PATH).exists():
-            print("*** CANNOT LOAD THE CONFIG FILE. EXITING ...***")
-            exit(1)
-
-        parameters = read_yaml_file(CONFIG_PATH)
+        parameters = load_config()
         users = {
             parameters["web_username"]: {
                 "name": parameters["web_username"],
-                "password": Hasher([parameters["web_password"]]).generate()[0]
+                "password": get_password_hash(parameters["web_password"])
             }
         }
 
@@ -60,21 +115,11 @@ def start_session(session, force: bool = False):
         )
 
         session_id = str(uuid.uuid4())
-        scheduler = Scheduler(
-            project_id=parameters["project_id"],
-            region=parameters["region"],
-            bucket_name=parameters["bucket_name"],
-            entity_name=DATASTORE_ENTITY_NAME,
-            artifacts_repository_name=parameters["artifacts_repository_name"],
-            batch_machine_type=parameters.get("batch_machine_type", "e2-standard-2")
-        )
 
         session_objects = [
             ("session_id", session_id),
-            ("scheduler", scheduler),
             ("new_experiment_kwargs", {}),
-            ("scheduler_image_exists", False),
-            ("new_experiment_suggested_name", scheduler.get_random_name()),
+            ("new_experiment_suggested_name", get_random_name()),
             ("auth", authenticator)
         ]
 
@@ -84,6 +129,14 @@ def start_session(session, force: bool = False):
         logging.info(f"A new session has started ({session_id}).")
 
 
+def attach_scheduler(session):
+    """ Makes the (shared) scheduler available in the session. It's done
+        only for logged-in users.
+    """
+    if "scheduler" not in session:
+        session["scheduler"] = get_scheduler()
+
+
 def map_job_status_to_text(status: int):
     messages = [":gray[UNSPECIFIED]", ":gray[QUEUED]", ":gray[SCHEDULED]", ":orange[RUNNING]",
                 ":green[SUCCEEDED]", ":red[FAILED]", ":red[DELETION_IN_PROGRESS]"]
@@ -105,6 +158,40 @@ def map_job_status_to_help(status: int):
 
 
 
+def get_status_text(scenario, queue_position: int | None):
+    if queue_position is not None:
+        return f":gray[QUEUED (#{queue_position})]"
+    if "cancelled" in scenario.timings:
+        return ":gray[CANCELLED]"
+    return map_job_status_to_text(scenario.status)
+
+
+def get_status_help(scenario, queue_position: int | None):
+    if queue_position is not None:
+        return (f"The job is waiting in the local queue (position: {queue_position}). "
+                "It will be submitted when other jobs finish.")
+    if "cancelled" in scenario.timings:
+        return "The job has been cancelled."
+    return map_job_status_to_help(scenario.status)
+
+
+def get_scenario_help(scenario):
+    if scenario.reused_from is not None:
+        return f"Results reused from: {scenario.reused_from}"
+    job_id = f"JobID: {scenario.batch_job_name}"
+    if scenario.batch_array_job is not None:
+        job_id = f"JobID: {scenario.batch_array_job} (task: {scenario.batch_task_index})"
+    if scenario.portfolio_size > 1:
+        job_id = f"{job_id} (portfolio of {scenario.portfolio_size} machines)"
+    if scenario.pooled:
+        job_id = f"{job_id} (solved by the pool of workers)"
+    if len(scenario.sizing):
+        return (f"{job_id}  \n"
+                f"Machine: {scenario.sizing['machine_type']} "
+                f"({scenario.sizing['num_workers']} workers)")
+    return job_id
+
+
 def inject_css_to_inline_buttons():
     return st.markdown(
         """
@@ -1 +1,18 @@
-from scheduler.scheduler import Scheduler
\ No newline at end of file
+# Note: Submodules are imported on first use (PEP 562), so e.g. the login page
+#       doesn't pay for pandas, plotly and GCP client libraries.
+import importlib
+
+_LAZY_ATTRIBUTES = {
+    "Scheduler": "scheduler.scheduler",
+    "ExperimentExistsError": "scheduler.scheduler",
+}
+
+__all__ = list(_LAZY_ATTRIBUTES)
+
+
+def __getattr__(name: str):
+    if name not in _LAZY_ATTRIBUTES:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_LAZY_ATTRIBUTES[name]), name)
+    globals()[name] = value
+    return value
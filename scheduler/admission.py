@@ -0,0 +1,137 @@
+import heapq
+import logging
+from threading import Lock
+from itertools import count
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List
+
+# Max number of attempts to submit a job (e.g. in case of transient API errors)
+MAX_SUBMIT_ATTEMPTS = 3
+
+
+@dataclass(order=True)
+class QueueEntry:
+    sort_key: tuple
+    job_name: str = field(compare=False)
+    vcpus: int = field(compare=False)
+    submit: Callable[[], None] = field(compare=False)
+    on_error: Callable[[Exception], None] | None = field(compare=False, default=None)
+    attempts: int = field(compare=False, default=0)
+
+
+class AdmissionQueue:
+    """ A local queue of Batch jobs that haven't been submitted yet. Jobs are
+        released only if there is enough capacity (number of running jobs
+        and/or vCPUs), so the regional Batch quotas are never exceeded.
+
+        Jobs with a higher priority go first. Within the same priority,
+        the shortest (estimated) jobs go first - it minimizes the mean
+        turnaround time.
+
+    Args:
+        max_running_jobs (int | None): Max number of jobs submitted at once
+        max_vcpus (int | None): Max number of vCPUs used by submitted jobs
+    """
+
+    def __init__(self, max_running_jobs: int | None = None,
+                 max_vcpus: int | None = None) -> None:
+        self.max_running_jobs = max_running_jobs
+        self.max_vcpus = max_vcpus
+
+        self._lock = Lock()
+        self._sequence = count()
+        self._queue: List[QueueEntry] = []
+        self._running: Dict[str, int] = {}
+        self._positions: Dict[str, int] = {}
+
+    def _update_positions(self) -> None:
+        self._positions = {entry.job_name: position for position, entry
+                           in enumerate(sorted(self._queue), start=1)}
+
+    def _has_capacity(self, vcpus: int) -> bool:
+        if self.max_running_jobs is not None and len(self._running) >= self.max_running_jobs:
+            return False
+        used_vcpus = sum(self._running.values())
+
+        # Note: A job that needs more vCPUs than the limit is released when
+        #       nothing else is running (otherwise it would wait forever).
+        if self.max_vcpus is not None and used_vcpus + vcpus > self.max_vcpus \
+                and len(self._running) > 0:
+            return False
+        return True
+
+    def push(self, job_name: str, submit: Callable[[], None], vcpus: int = 1,
+             priority: int = 0, estimated_cost: float = 0,
+             on_error: Callable[[Exception], None] | None = None) -> None:
+        """ Adds a job to the queue
+
+        Args:
+            job_name (str): Unique name of the job
+            submit (Callable): Submits the job to Batch
+            vcpus (int): Number of vCPUs used by the job
+            priority (int): Jobs with higher priority are submitted first
+            estimated_cost (float): Estimated running time (in any unit)
+            on_error (Callable): Called if the job couldn't be submitted
+                (after a few attempts)
+        """
+        with self._lock:
+            sort_key = (-priority, estimated_cost, next(self._sequence))
+            heapq.heappush(self._queue, QueueEntry(sort_key, job_name, vcpus, submit, on_error))
+            self._update_positions()
+
+    def mark_as_running(self, job_name: str, vcpus: int = 1) -> None:
+        """ Tracks a job that has been submitted outside of the queue
+            (e.g. before the app restarted)
+        """
+        with self._lock:
+            self._running[job_name] = vcpus
+
+    def remove(self, job_name: str) -> None:
+        with self._lock:
+            self._running.pop(job_name, None)
+            self._queue = [entry for entry in self._queue if entry.job_name != job_name]
+            heapq.heapify(self._queue)
+            self._update_positions()
+
+    def release(self, job_name: str) -> None:
+        """ Frees the capacity used by a job that has finished """
+        with self._lock:
+            self._running.pop(job_name, None)
+
+    def position(self, job_name: str) -> int | None:
+        return self._positions.get(job_name)
+
+    def __len__(self) -> int:
+        return len(self._queue)
+
+    def dispatch(self) -> List[str]:
+        """ Submits queued jobs for as long as there is capacity available
+
+        Returns:
+            List[str]: Names of the submitted jobs
+        """
+        to_submit = []
+        with self._lock:
+            while len(self._queue) and self._has_capacity(self._queue[0].vcpus):
+                entry = heapq.heappop(self._queue)
+                self._running[entry.job_name] = entry.vcpus
+                to_submit.append(entry)
+            if len(to_submit):
+                self._update_positions()
+
+        submitted = []
+        for entry in to_submit:
+            try:
+                entry.submit()
+                submitted.append(entry.job_name)
+            except Exception as error:
+                entry.attempts += 1
+                logging.error(f"Cannot submit {entry.job_name} (attempt {entry.attempts}): {error}")
+                with self._lock:
+                    self._running.pop(entry.job_name, None)
+                    if entry.attempts < MAX_SUBMIT_ATTEMPTS:
+                        heapq.heappush(self._queue, entry)
+                    self._update_positions()
+                if entry.attempts >= MAX_SUBMIT_ATTEMPTS and entry.on_error is not None:
+                    entry.on_error(error)
+        return submitted
@@ -0,0 +1,144 @@
+import os
+import atexit
+import shutil
+import hashlib
+import tempfile
+import logging
+from threading import Lock
+from collections import OrderedDict
+from typing import Callable, Dict
+
+
+class ResultsCache:
+    """ A thread-safe LRU cache for raw artifacts (e.g. `results.json`) bounded
+        by their total size in bytes. Entries evicted from memory can be spilled
+        to a local directory (bounded as well), so they can be restored without
+        downloading them again.
+
+    Args:
+        max_size_bytes (int): Memory budget
+        spill_dir (str): Directory for evicted entries (disabled if not set).
+            Every cache gets its own private sub-directory in it, so nothing
+            else in the directory is ever touched.
+        max_spill_size_bytes (int): Disk budget (defaults to 4x the memory one)
+    """
+
+    def __init__(self, max_size_bytes: int, spill_dir: str | None = None,
+                 max_spill_size_bytes: int | None = None) -> None:
+        self.max_size_bytes = max_size_bytes
+        self.spill_dir = None
+        self.max_spill_size_bytes = max_spill_size_bytes or 4 * max_size_bytes
+
+        self._lock = Lock()
+        self._memory: OrderedDict[str, bytes] = OrderedDict()
+        self._memory_size = 0
+        self._disk: OrderedDict[str, int] = OrderedDict()
+        self._disk_size = 0
+
+        if spill_dir:
+            # Note: Spilled files from a previous process can't be trusted
+            #       (an experiment might have been re-created under the same
+            #       name), so a new directory is created and it's removed when
+            #       the process exits.
+            os.makedirs(spill_dir, exist_ok=True)
+            self.spill_dir = tempfile.mkdtemp(prefix="results-cache-", dir=spill_dir)
+            atexit.register(shutil.rmtree, self.spill_dir, ignore_errors=True)
+
+    @property
+    def size_bytes(self) -> int:
+        return self._memory_size
+
+    def _spill_path(self, key: str) -> str:
+        return os.path.join(self.spill_dir, hashlib.sha1(key.encode()).hexdigest())
+
+    def _put_in_memory(self, key: str, content: bytes) -> None:
+        if len(content) > self.max_size_bytes:
+            self._spill(key, content)
+            return
+
+        self._memory[key] = content
+        self._memory_size += len(content)
+        while self._memory_size > self.max_size_bytes:
+            evicted_key, evicted = self._memory.popitem(last=False)
+            self._memory_size -= len(evicted)
+            self._spill(evicted_key, evicted)
+
+    def _spill(self, key: str, content: bytes) -> None:
+        if not self.spill_dir or len(content) > self.max_spill_size_bytes:
+            return
+
+        with open(self._spill_path(key), "wb") as file:
+            file.write(content)
+        self._disk[key] = len(content)
+        self._disk_size += len(content)
+
+        while self._disk_size > self.max_spill_size_bytes:
+            evicted_key, size = self._disk.popitem(last=False)
+            self._disk_size -= size
+            self._remove_spilled(evicted_key)
+
+    def _remove_spilled(self, key: str) -> None:
+        try:
+            os.remove(self._spill_path(key))
+        except FileNotFoundError:
+            pass
+
+    def _restore(self, key: str) -> bytes | None:
+        size = self._disk.pop(key, None)
+        if size is None:
+            return None
+
+        self._disk_size -= size
+        try:
+            with open(self._spill_path(key), "rb") as file:
+                content = file.read()
+        except FileNotFoundError:
+            return None
+        self._remove_spilled(key)
+        return content
+
+    def get(self, key: str, load: Callable[[], bytes]) -> bytes:
+        """ Returns the cached content for `key`. On a miss, `load` is called
+            (outside of the lock) and its result is cached.
+        """
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return self._memory[key]
+
+            content = self._restore(key)
+            if content is not None:
+                self._put_in_memory(key, content)
+                return content
+
+        content = load()
+        with self._lock:
+            if key not in self._memory:
+                self._put_in_memory(key, content)
+        return content
+
+    def invalidate(self, key: str) -> None:
+        with self._lock:
+            content = self._memory.pop(key, None)
+            if content is not None:
+                self._memory_size -= len(content)
+            size = self._disk.pop(key, None)
+            if size is not None:
+                self._disk_size -= size
+                self._remove_spilled(key)
+
+
+_shared_caches: Dict[str, ResultsCache] = {}
+_shared_caches_lock = Lock()
+
+
+def get_shared_results_cache(max_size_bytes: int, spill_dir: str | None = None,
+                             name: str = "results") -> ResultsCache:
+    """ Returns a cache (one per `name`) shared by all sessions served by this
+        process. The parameters are used only when the cache is created.
+    """
+    with _shared_caches_lock:
+        if name not in _shared_caches:
+            logging.debug(f"Creating a shared {name} cache ({max_size_bytes} bytes).")
+            _shared_caches[name] = ResultsCache(max_size_bytes, spill_dir)
+        return _shared_caches[name]
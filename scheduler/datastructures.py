@@ -1,3 +1,4 @@
+from datetime import datetime, timezone
 from dataclasses import dataclass, field
 from typing import List
 from scheduler.googlecloudplatform.batch import JobStatus
@@ -9,11 +10,25 @@ class Scenario:
     params: dict
     remote_data_path: str
     metrics: dict = field(default_factory=dict)
-    results: list = field(default_factory=list)
     status: JobStatus.State = JobStatus.State.QUEUED
+    reuse_key: str | None = None
+    reused_from: str | None = None
+    solver_args: List[str] = field(default_factory=list)
+    submitted: bool = True
+    priority: int = 0
+    estimated_cost: float = 0
+    sizing: dict = field(default_factory=dict)
+    timings: dict = field(default_factory=dict)
+    solver_phases: dict = field(default_factory=dict)
+    batch_array_job: str | None = None
+    batch_task_index: int | None = None
+    portfolio_size: int = 1
+    pooled: bool = False
 
 @dataclass
 class Experiment:
     experiment_name: str
     scenarios: List[Scenario] = field(default_factory=list)
     status: JobStatus.State = JobStatus.State.QUEUED
+    created_at: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
+    instance_hash: str | None = None
@@ -0,0 +1,109 @@
+import json
+import zipfile
+from datetime import datetime
+from typing import BinaryIO, Callable, Dict
+
+from scheduler.datastructures import Experiment, Scenario
+from scheduler.googlecloudplatform import CloudStorageClient
+
+# Files of a scenario that are exported (the ones missing, e.g. results of
+# a failed scenario, are skipped)
+EXPORTED_FILES = ("params.json", "metrics.json", "results.json")
+
+
+def _get_manifest(experiment: Experiment) -> Dict:
+    return {
+        "experiment_name": experiment.experiment_name,
+        "created_at": experiment.created_at.isoformat(),
+        "instance_hash": experiment.instance_hash,
+        "scenarios": [{"scenario_name": scenario.scenario_name,
+                       "status": scenario.status.name,
+                       "reused_from": scenario.reused_from}
+                      for scenario in experiment.scenarios],
+    }
+
+
+def export_experiment_zip(storage: CloudStorageClient, experiment: Experiment,
+                          output: BinaryIO) -> None:
+    """ Writes scenarios' files into a zip archive (`<scenario>/<file>`) plus
+        `experiment.json` with the list of scenarios and their statuses.
+
+        Note: Files are streamed from the storage straight into the archive
+              (one chunk at a time), so `output` can be a non-seekable stream
+              (e.g. `CloudStorageClient.open_for_writing`).
+    """
+    with zipfile.ZipFile(output, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("experiment.json", json.dumps(_get_manifest(experiment), indent=4))
+        for scenario in experiment.scenarios:
+            available = storage.list_files(scenario.remote_data_path)
+            for name in EXPORTED_FILES:
+                if name not in available:
+                    continue
+                # Note: The size is unknown upfront, so ZIP64 is allowed (results
+                #       of huge instances can exceed 2 GB).
+                with archive.open(f"{scenario.scenario_name}/{name}", "w",
+                                  force_zip64=True) as entry:
+                    storage.download_to_stream(f"{scenario.remote_data_path}/{name}", entry)
+
+
+def _scenario_to_table(storage: CloudStorageClient, scenario: Scenario, schema):
+    import pyarrow as pa
+
+    available = storage.list_files(scenario.remote_data_path)
+    results = []
+    if "results.json" in available:
+        results = storage.download_content(f"{scenario.remote_data_path}/results.json",
+                                           json.loads)
+
+    # Note: A scenario without results (e.g. a failed one) is kept as a single
+    #       row, so its parameters and metrics are still exported.
+    num_rows = max(1, len(results))
+    columns = {
+        "scenario": [scenario.scenario_name] * num_rows,
+        "status": [scenario.status.name] * num_rows,
+        "params": [json.dumps(scenario.params)] * num_rows,
+        "metrics": [json.dumps(scenario.metrics)] * num_rows,
+        "machine": [task["Task"] for task in results] or [None],
+        "job": [task["Resource"] for task in results] or [None],
+        "start": [datetime.fromisoformat(task["Start"]) for task in results] or [None],
+        "finish": [datetime.fromisoformat(task["Finish"]) for task in results] or [None],
+        "details": [task.get("Hoverdata") for task in results] or [None],
+    }
+    return pa.Table.from_pydict(columns, schema=schema)
+
+
+def export_experiment_parquet(storage: CloudStorageClient, experiment: Experiment,
+                              output: BinaryIO) -> None:
+    """ Writes all scenarios into a single Parquet table, one row per task
+        (keyed by the scenario's name). Parameters and metrics are stored as
+        JSON strings.
+
+        Note: Every scenario is a separate row group, so only the results of
+              a single scenario are held in memory at a time. Repeated values
+              (scenario, parameters, metrics) are dictionary encoded.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        ("scenario", pa.string()),
+        ("status", pa.string()),
+        ("params", pa.string()),
+        ("metrics", pa.string()),
+        ("machine", pa.string()),
+        ("job", pa.string()),
+        ("start", pa.timestamp("s")),
+        ("finish", pa.timestamp("s")),
+        ("details", pa.string()),
+    ])
+    metadata = {b"experiment": json.dumps(_get_manifest(experiment)).encode()}
+
+    with pq.ParquetWriter(output, schema.with_metadata(metadata), compression="zstd") as writer:
+        for scenario in experiment.scenarios:
+            writer.write_table(_scenario_to_table(storage, scenario, writer.schema))
+
+
+EXPORT_FORMATS: Dict[str, Callable[[CloudStorageClient, Experiment, BinaryIO], None]] = {
+    "zip": export_experiment_zip,
+    "parquet": export_experiment_parquet,
+}
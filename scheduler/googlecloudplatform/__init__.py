@@ -1,5 +1,22 @@
-from scheduler.googlecloudplatform.storage import CloudStorageClient
-from scheduler.googlecloudplatform.batch import BatchClient, JobStatus
-from scheduler.googlecloudplatform.datastore import DatastoreClient
-from scheduler.googlecloudplatform.artifacts_registry import ArtifactsRegistryClient
-from scheduler.googlecloudplatform.build import CloudBuildClient
\ No newline at end of file
+# Note: Every client library is heavy to import, so clients are imported
+#       on first use (PEP 562).
+import importlib
+
+_LAZY_ATTRIBUTES = {
+    "CloudStorageClient": "scheduler.googlecloudplatform.storage",
+    "BatchClient": "scheduler.googlecloudplatform.batch",
+    "JobStatus": "scheduler.googlecloudplatform.batch",
+    "DatastoreClient": "scheduler.googlecloudplatform.datastore",
+    "ArtifactsRegistryClient": "scheduler.googlecloudplatform.artifacts_registry",
+    "CloudBuildClient": "scheduler.googlecloudplatform.build",
+}
+
+__all__ = list(_LAZY_ATTRIBUTES)
+
+
+def __getattr__(name: str):
+    if name not in _LAZY_ATTRIBUTES:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_LAZY_ATTRIBUTES[name]), name)
+    globals()[name] = value
+    return value
@@ -16,15 +16,19 @@ class ArtifactsRegistryClient():
         """ Splits Docker URI into: path, name and tag """
         return re.split("/|:", uri)
 
-    def check_if_container_exists(self, container_uri: str,
-                                  tag: str = "latest"):
-
-        *_, container_name, _ = self.split_docker_uri(container_uri)
+    def get_container_digest(self, container_uri: str) -> str | None:
+        """ Returns the digest (`sha256:...`) of the image that the URI's tag
+            points at or None if there is no such tag
+        """
+        *_, container_name, tag = self.split_docker_uri(container_uri)
         uri = (f"projects/{self.project_id}/locations/{self.region}/"
                f"repositories/{self.repository_name}/packages/"
                f"{container_name}/tags/{tag}")
         try:
-            _ = self.client.get_tag(dict(name=uri))
-            return True
+            # Note: The tag's version is `.../versions/sha256:<digest>`
+            return self.client.get_tag(dict(name=uri)).version.split("/")[-1]
         except NotFound:
-            return False
+            return None
+
+    def check_if_container_exists(self, container_uri: str) -> bool:
+        return self.get_container_digest(container_uri) is not None
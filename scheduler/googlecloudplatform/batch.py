@@ -2,11 +2,38 @@ import uuid
 import random
 import string
 import logging
-from typing import List, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Dict, List, Tuple
 
 from google.cloud import batch_v1
+from google.api_core.exceptions import NotFound
 from google.cloud.compute_v1 import MachineTypesClient
-from google.cloud.batch_v1.types import JobStatus, AllocationPolicy
+from google.cloud.batch_v1.types import JobStatus, TaskStatus, AllocationPolicy
+
+# Tasks of an array job are reported in terms of job's states
+TASK_TO_JOB_STATE = {
+    TaskStatus.State.STATE_UNSPECIFIED: JobStatus.State.STATE_UNSPECIFIED,
+    TaskStatus.State.PENDING: JobStatus.State.QUEUED,
+    TaskStatus.State.ASSIGNED: JobStatus.State.SCHEDULED,
+    TaskStatus.State.RUNNING: JobStatus.State.RUNNING,
+    TaskStatus.State.SUCCEEDED: JobStatus.State.SUCCEEDED,
+    TaskStatus.State.FAILED: JobStatus.State.FAILED,
+    # Note: A task is left unexecuted if the job has failed before it started
+    TaskStatus.State.UNEXECUTED: JobStatus.State.FAILED,
+}
+
+
+@lru_cache(maxsize=None)
+def _fetch_machine_parameters(project_id: str, region: str, machine_type: str) -> Tuple[int, int]:
+    """ Number of vCPUs and memory (in MB) of a machine type. They never change,
+        so they're fetched once per process (the cache doesn't hold any client).
+    """
+    client = MachineTypesClient()
+    zone = region + "-a"
+    data = client.get(machine_type=machine_type, project=project_id, zone=zone)
+    return data.guest_cpus, data.memory_mb
+
 
 class BatchClient:
 
@@ -35,10 +62,7 @@ class BatchClient:
         return random.choice(string.ascii_lowercase) + str(uuid.uuid4())[1:]
 
     def _get_machine_parameters(self, machine_type: str) -> Tuple[int, int]:
-        client = MachineTypesClient()
-        zone = self.region + "-a"
-        data = client.get(machine_type=machine_type, project=self.project_id, zone=zone)
-        return data.guest_cpus, data.memory_mb
+        return _fetch_machine_parameters(self.project_id, self.region, machine_type)
 
     def _validate_compute_parameters(self, machine_type: str, vcpu_per_task: int,
                                      memory_per_task: int, num_of_parallel_tasks: int) -> None:
@@ -99,7 +123,20 @@ class BatchClient:
                       bucket_path_to_mount: str = None, task_max_retry: int = 2,
                       compute_vcpu_per_task: int = 1, compute_memory_per_task: int = 1024,
                       task_max_duration: str = "3600s", task_num_parallel_executions: int = 1,
-                      machine_type: str = "e2-standard-4") -> str:
+                      machine_type: str = "e2-standard-4", task_count: int | None = None,
+                      spot: bool = False, parallelism: int | None = None) -> str:
+        """ Creates a job. By default it's a single task (or
+            `task_num_parallel_executions` copies of it on the same machine).
+
+            With `task_count`, it's an array job: every task gets its own
+            `BATCH_TASK_INDEX` (0, 1, ...) and Batch places tasks on as many
+            VMs as it needs. `parallelism` limits the number of tasks that
+            run at once (the others wait for them to finish).
+
+            With `spot`, tasks run on Spot VMs (much cheaper, but they can be
+            preempted at any time - a preempted task is retried like a failed
+            one, up to `task_max_retry` times).
+        """
 
         # Generate job name if not provided
         job_name = custom_job_name or self._generate_job_id()
@@ -132,7 +169,9 @@ class BatchClient:
         # Note: Tasks are grouped inside a job using TaskGroups.
         #       Currently, it's possible to have only one task group.
         group = batch_v1.TaskGroup()
-        group.task_count = task_num_parallel_executions
+        group.task_count = task_count or task_num_parallel_executions
+        if parallelism is not None:
+            group.parallelism = parallelism
         group.task_spec = task
 
         # Define how to allocate resources
@@ -153,6 +192,8 @@ class BatchClient:
         # Define instances params
         policy = batch_v1.AllocationPolicy.InstancePolicy()
         policy.machine_type = machine_type
+        if spot:
+            policy.provisioning_model = AllocationPolicy.ProvisioningModel.SPOT
         instances = batch_v1.AllocationPolicy.InstancePolicyOrTemplate()
         instances.policy = policy
         allocation_policy.instances = [instances]
@@ -179,14 +220,43 @@ class BatchClient:
     def list_jobs(self):
         return self.client.list_jobs(parent=self.parent)
 
-    def list_tasks(self):
-        raise NotImplementedError("This functionality has not been implemented.")
+    def list_tasks(self, job_name: str) -> Dict[int, JobStatus.State]:
+        """ States of all tasks of a job (by task index). Tasks are listed in
+            pages of up to 1000, so it's a single request for most array jobs.
+        """
+        # Note: The only task group of a job is always called `group0`
+        parent = f"{self.parent}/jobs/{job_name}/taskGroups/group0"
+        states = {}
+        for task in self.client.list_tasks(parent=parent, page_size=1000):
+            task_index = int(task.name.rsplit("/", 1)[-1])
+            states[task_index] = TASK_TO_JOB_STATE.get(task.status.state,
+                                                       JobStatus.State.STATE_UNSPECIFIED)
+        return states
 
     def delete_job(self, job_name: str):
         # Note: When a job is deleted it disappears from the system
         #       and checking its status would raise an Exception.
         return self.client.delete_job(name=f"{self.parent}/jobs/{job_name}")
 
+    def delete_jobs(self, job_names: List[str], max_parallel_requests: int = 16) -> None:
+        """ Deletes (and so terminates) many jobs at once. Requests are sent
+            concurrently and the deletions are not awaited - VMs are released
+            by Batch in the background. Jobs that don't exist are skipped.
+        """
+
+        def _delete(job_name: str) -> None:
+            try:
+                self.delete_job(job_name)
+            except NotFound:
+                pass
+            except Exception as error:
+                logging.error(f"Cannot delete the job {job_name}: {error}")
+
+        if len(job_names) == 0:
+            return
+        with ThreadPoolExecutor(max_workers=min(max_parallel_requests, len(job_names))) as executor:
+            list(executor.map(_delete, job_names))
+
     def get_job(self, job_name: str):
         return self.client.get_job(name=f"{self.parent}/jobs/{job_name}")
 
@@ -7,7 +7,20 @@ class CloudBuildClient():
         self.client = cloudbuild_v1.CloudBuildClient()
 
     def build_container_from_archive(self, bucket_name: str, relative_path: str,
-                                     container_uri: str):
+                                     container_uri: str, cache_from: str | None = None) -> str:
+        """ Builds an image from a zipped build context and pushes it
+
+        Args:
+            bucket_name (str): Bucket with the archive
+            relative_path (str): Path to the archive inside the bucket
+            container_uri (str): URI (with a tag) of the image to build
+            cache_from (str): URI of an image whose layers are reused (if it
+                exists). It's also tagged with the new image, so the next build
+                starts from it.
+
+        Returns:
+            str: Digest (`sha256:...`) of the pushed image
+        """
         source = {
             "storage_source": {
                 "bucket": bucket_name,
@@ -15,17 +28,32 @@ class CloudBuildClient():
             }
         }
 
-        steps = [
-            {
+        images = [container_uri]
+        build_args = ["build", "-t", container_uri, "."]
+        steps = []
+        if cache_from is not None:
+            images.append(cache_from)
+            build_args[1:1] = ["--cache-from", cache_from, "-t", cache_from,
+                               "--build-arg", "BUILDKIT_INLINE_CACHE=1"]
+            # Note: The very first build has nothing to pull
+            steps.append({
                 "name": "gcr.io/cloud-builders/docker",
-                "args": ["build", "-t", container_uri, "."]
-            },
-            {
-                "name": "gcr.io/cloud-builders/docker",
-                "args": ["push", container_uri]
-            }
-        ]
+                "entrypoint": "bash",
+                "args": ["-c", f"docker pull {cache_from} || exit 0"]
+            })
+        # Note: BuildKit has to be turned on explicitly in the builder - only
+        #       then the cache metadata is embedded into the image and
+        #       `--cache-from` can use it in the next build.
+        steps.append({
+            "name": "gcr.io/cloud-builders/docker",
+            "args": build_args,
+            "env": ["DOCKER_BUILDKIT=1"]
+        })
 
-        build = cloudbuild_v1.Build(source=source, steps=steps)
+        # Note: Images listed in `images` are pushed by Cloud Build itself
+        #       and their digests are reported in the build's results.
+        build = cloudbuild_v1.Build(source=source, steps=steps, images=images)
         job = self.client.create_build(project_id=self.project_id, build=build)
-        return job.result()
+        result = job.result()
+        return next(image.digest for image in result.results.images
+                    if image.name == container_uri)
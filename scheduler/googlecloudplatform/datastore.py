@@ -1,68 +1,130 @@
 import logging
-from typing import Any, List, Iterable, Tuple, Dict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, List, Iterable, Tuple, Dict
+from google.api_core.exceptions import Aborted, Conflict
+from google.api_core.retry import Retry, if_exception_type
 from google.cloud import datastore
-from google.cloud.datastore import Entity
+from google.cloud.datastore import Entity, Key
+
+# Note: A single commit (and lookup) can't contain more than 500 entities
+#       and an `IN` filter can't have more than 30 values.
+#       See: https://cloud.google.com/datastore/docs/concepts/limits
+MAX_ENTITIES_PER_REQUEST = 500
+MAX_IN_FILTER_VALUES = 30
+
+# Note: Concurrent transactions on the same entities (e.g. the poller and
+#       a session) fail with `Aborted`/`Conflict`. They're retried as a whole
+#       (the read included) for a while.
+TRANSACTION_RETRY = Retry(predicate=if_exception_type(Aborted, Conflict),
+                          initial=0.1, maximum=2.0, multiplier=2.0, timeout=30.0)
 
 
 class DatastoreClient:
 
-    def __init__(self, entity_kind: str) -> None:
+    def __init__(self, entity_kind: str, max_parallel_requests: int = 1) -> None:
         self.entity_kind = entity_kind
+        self.max_parallel_requests = max_parallel_requests
         logging.debug(f"Creating a Datastore client. Entity kind: {entity_kind}")
         self.client = datastore.Client()
 
+    def _key(self, id_or_name: int | str | None) -> Key:
+        if id_or_name is None:
+            return self.client.key(self.entity_kind, id=None)
+        return self.client.key(self.entity_kind, id_or_name)
+
+    def _dispatch(self, function: Callable, items: List[Any]) -> List[Any]:
+        """ Splits `items` into chunks that fit into a single request and calls
+            `function` for each of them (in parallel if `max_parallel_requests` > 1).
+        """
+        chunks = [items[idx:idx + MAX_ENTITIES_PER_REQUEST]
+                  for idx in range(0, len(items), MAX_ENTITIES_PER_REQUEST)]
+
+        if self.max_parallel_requests > 1 and len(chunks) > 1:
+            with ThreadPoolExecutor(max_workers=self.max_parallel_requests) as executor:
+                return list(executor.map(function, chunks))
+        return [function(chunk) for chunk in chunks]
+
     def get(self, id_or_name: str | int) -> Entity | None:
         key = self.client.key(self.entity_kind, id_or_name)
         return self.client.get(key)
 
-    def batch_insert(self, batch_data: list[Dict]):
+    def get_multi(self, ids: List[int | str]) -> List[Entity]:
+        keys = [self._key(id_or_name) for id_or_name in ids]
+        chunks = self._dispatch(self.client.get_multi, keys)
+        return [entity for chunk in chunks for entity in chunk]
+
+    def batch_insert(self, batch_data: list[Dict], ids: list[int | str] | None = None,
+                     _to_exclude=()):
+        ids = ids or [None] * len(batch_data)
         entities = []
-        for entity_dict in batch_data:
-            entity = datastore.Entity(self.client.key(self.entity_kind, id=None))
+        for id_or_name, entity_dict in zip(ids, batch_data):
+            entity = datastore.Entity(self._key(id_or_name), exclude_from_indexes=_to_exclude)
             entity.update(entity_dict)
             entities.append(entity)
-        self.client.put_multi(entities)
+        self._dispatch(self.client.put_multi, entities)
         return None
 
     def update(self, entry_id: int | str | None, content: Dict[Any, str], _to_exclude=()) -> Entity:
 
-        entry = None
-
         if entry_id is None:
-            key = self.client.key(self.entity_kind, id=None)
-            entry = datastore.Entity(key, exclude_from_indexes=_to_exclude)
-        else:
-            entry = self.get(entry_id)
-            if entry is None:
-                key = self.client.key(self.entity_kind, entry_id)
-                entry = datastore.Entity(key, exclude_from_indexes=_to_exclude)
-
-        entry.update(content)
-        self.client.put(entry)
-        return entry
+            entry = datastore.Entity(self._key(None), exclude_from_indexes=_to_exclude)
+            entry.update(content)
+            self.client.put(entry)
+            return entry
+
+        # Note: The read and the write are done in a transaction, so concurrent
+        #       updates of the same entity can't overwrite each other.
+        @TRANSACTION_RETRY
+        def _update() -> Entity:
+            with self.client.transaction():
+                key = self._key(entry_id)
+                entry = self.client.get(key)
+                if entry is None:
+                    entry = datastore.Entity(key, exclude_from_indexes=_to_exclude)
+                entry.update(content)
+                self.client.put(entry)
+            return entry
+
+        return _update()
+
+    def update_multi(self, contents: Dict[int | str, Dict], _to_exclude=()) -> None:
+        """ Read-modify-write of many entities. Every chunk is updated in a single
+            transaction (one lookup and one commit).
+        """
+
+        @TRANSACTION_RETRY
+        def _update_chunk(ids: List[int | str]) -> None:
+            with self.client.transaction():
+                keys = [self._key(id_or_name) for id_or_name in ids]
+                entries = {entry.key.id_or_name: entry
+                           for entry in self.client.get_multi(keys)}
+                for key, id_or_name in zip(keys, ids):
+                    entry = entries.get(id_or_name)
+                    if entry is None:
+                        entry = datastore.Entity(key, exclude_from_indexes=_to_exclude)
+                    entry.update(contents[id_or_name])
+                    entries[id_or_name] = entry
+                self.client.put_multi(list(entries.values()))
+
+        self._dispatch(_update_chunk, list(contents.keys()))
 
     def delete(self, id: int | str):
         key = self.client.key(self.entity_kind, id)
         self.client.delete(key)
 
+    def delete_multi(self, ids: List[int | str]) -> None:
+        keys = [self._key(id_or_name) for id_or_name in ids]
+        self._dispatch(self.client.delete_multi, keys)
+
     def delete_all(self, yes_i_im_sure: bool = False):
 
         if not yes_i_im_sure:
             return
 
-        cursor, first_iteration = None, True
-        while (cursor is not None or first_iteration):
-            entities, new_cursor = self.list_batch(batch_size=50, cursor=cursor)
-            for entity in entities:
-                id = entity.key.name if entity.key.name is not None else \
-                    entity.key.id
-                key = self.client.key(self.entity_kind, id)
-                self.client.delete(key)
-            cursor = new_cursor
-            first_iteration = False
+        keys = list(self.list_keys())
+        self._dispatch(self.client.delete_multi, keys)
 
-    def list_all(self, order: str | None = None, filter: List[str] | None = None
-                 ) -> Iterable:
+    def _build_query(self, order: str | None = None, filter: List[str] | None = None):
 
         if order is not None and filter is not None:
             raise ValueError("Two filters at the same time is not supported.")
@@ -75,23 +137,24 @@ class DatastoreClient:
         if filter is not None:
             query.add_filter(*filter)
 
-        return query.fetch()
+        return query
+
+    def list_keys(self, order: str | None = None, filter: List[str] | None = None
+                  ) -> Iterable[Key]:
+        """ Keys-only query: entities' properties are not transferred at all """
+        query = self._build_query(order, filter)
+        query.keys_only()
+        return (entity.key for entity in query.fetch())
+
+    def list_all(self, order: str | None = None, filter: List[str] | None = None
+                 ) -> Iterable:
+        return self._build_query(order, filter).fetch()
 
     def list_batch(self, order: str | None = None, filter: List[str] | None = None,
                    batch_size: int = 50, cursor: bytes | None = None
                    ) -> Tuple[Iterable, bytes | None]:
 
-        if order is not None and filter is not None:
-            raise ValueError("Two filters at the same time is not supported.")
-
-        query = self.client.query(kind=self.entity_kind)
-
-        if order is not None:
-            query.order = [order]
-
-        if filter is not None:
-            query.add_filter(*filter)
-
+        query = self._build_query(order, filter)
         query_iter = query.fetch(start_cursor=cursor, limit=batch_size)
         page = next(query_iter.pages)
         next_cursor = query_iter.next_page_token
@@ -1,13 +1,42 @@
 # Copyright (C) Fourteen33 Inc. - All Rights Reserved
 
+import time
 from io import BytesIO
-from typing import Tuple, List, Callable
+from typing import BinaryIO, Dict, Iterator, Set, Tuple, List, Callable
+
+import google.auth
+from requests.adapters import HTTPAdapter
+from google.auth.transport.requests import AuthorizedSession
+from google.api_core.exceptions import PreconditionFailed
 from google.cloud import storage as gcstorage
 
+# Note: A single batch request can't contain more than 100 calls
+#       See: https://cloud.google.com/storage/docs/batch
+MAX_CALLS_PER_BATCH = 100
+
+
 class CloudStorageClient:
 
-    def __init__(self):
-        self.client = gcstorage.Client()
+    def __init__(self, http_pool_size: int = 32, listing_cache_ttl: float = 0):
+        credentials, project = google.auth.default(scopes=gcstorage.Client.SCOPE)
+        self.client = gcstorage.Client(project=project, credentials=credentials,
+                                       _http=self._create_http_session(credentials,
+                                                                       http_pool_size))
+        self._buckets: Dict[str, gcstorage.Bucket] = {}
+
+        # Listings are cached for `listing_cache_ttl` seconds (0 disables the cache)
+        self.listing_cache_ttl = listing_cache_ttl
+        self._listings: Dict[str, Tuple[float, Set[str]]] = {}
+
+    def _create_http_session(self, credentials, pool_size: int) -> AuthorizedSession:
+        """ Creates an authorized HTTP session that keeps up to `pool_size`
+            connections open. The default pool (10 connections) is too small
+            when the poller downloads results from many threads at once.
+        """
+        session = AuthorizedSession(credentials)
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        session.mount("https://", adapter)
+        return session
 
     def uri(self, path: str) -> str:
         return self._add_gs(path)
@@ -22,10 +51,19 @@ class CloudStorageClient:
             return path[5:]
         return path
 
+    def _get_bucket(self, bucket_name: str) -> gcstorage.Bucket:
+        """ Returns a cached bucket handle. Unlike `client.get_bucket()` it doesn't
+            send any request - the bucket's metadata is never needed to read
+            or write objects.
+        """
+        bucket = self._buckets.get(bucket_name)
+        if bucket is None:
+            bucket = self._buckets.setdefault(bucket_name, self.client.bucket(bucket_name))
+        return bucket
+
     def _get_blob(self, bucket_path: str) -> gcstorage.Blob:
         bucket_name, relative_path = self._split_bucket_path(bucket_path)
-        bucket = self.client.get_bucket(bucket_name)
-        return bucket.blob(relative_path)
+        return self._get_bucket(bucket_name).blob(relative_path)
 
     def _split_bucket_path(self, path: str) -> Tuple[str, str]:
         """ Splits bucket path into bucket name and relative path
@@ -40,15 +78,22 @@ class CloudStorageClient:
         divider_idx = path.find("/")
         return path[:divider_idx], path[divider_idx + 1:]
 
-    def _pre_upload(self, remote_path: str, overwrite: bool) -> gcstorage.Blob:
+    def _upload(self, remote_path: str, overwrite: bool, upload: Callable) -> None:
+        """ Uploads a blob in a single request. Instead of checking if the file
+            exists beforehand, the write is conditional (`if_generation_match=0`
+            means "only if there is no live object under this name").
+        """
         remote_path = self._add_gs(remote_path)
         blob = self._get_blob(remote_path)
-        if not overwrite and blob.exists():
+        self._invalidate_listings(remote_path)
+        preconditions = {} if overwrite else {"if_generation_match": 0}
+        try:
+            upload(blob, **preconditions)
+        except PreconditionFailed:
             message = "File already exists! Set `overwrite` to True to " \
                       "overwrie the content of a file on GCS.\n\n" \
                       f"Related path: {remote_path}"
             raise FileExistsError(message)
-        return blob
 
     def file_exists(self, remote_path: str) -> bool:
         remote_path = self._add_gs(remote_path)
@@ -57,21 +102,21 @@ class CloudStorageClient:
 
     def upload_file(self, local_path: str, remote_path: str,
                     overwrite: bool = False) -> None:
-        blob = self._pre_upload(remote_path, overwrite)
-        blob.upload_from_filename(local_path)
+        self._upload(remote_path, overwrite,
+                     lambda blob, **kwargs: blob.upload_from_filename(local_path, **kwargs))
 
     def upload_from_bytes(self, remote_path: str, content_bytes: bytes,
                           overwrite: bool = False) -> None:
 
         content_bytes = BytesIO(content_bytes)
         content_bytes.seek(0)
-        blob = self._pre_upload(remote_path, overwrite)
-        blob.upload_from_file(content_bytes)
+        self._upload(remote_path, overwrite,
+                     lambda blob, **kwargs: blob.upload_from_file(content_bytes, **kwargs))
 
     def upload_content(self, remote_path: str, content: str,
                        overwrite: bool = False) -> None:
-        blob = self._pre_upload(remote_path, overwrite)
-        blob.upload_from_string(content)
+        self._upload(remote_path, overwrite,
+                     lambda blob, **kwargs: blob.upload_from_string(content, **kwargs))
 
     def download_file(self, remote_path: str, local_path: str) -> None:
         remote_path = self._add_gs(remote_path)
@@ -81,28 +126,114 @@ class CloudStorageClient:
     def download_content(self, remote_path: str, parse_content: Callable = lambda x: x) -> str:
         remote_path = self._add_gs(remote_path)
         blob = self._get_blob(remote_path)
-        return parse_content(blob.download_as_string())
+        return parse_content(blob.download_as_bytes())
 
-    def list_files(self, remote_path: str) -> List[str]:
-        """ Lists all files that are inside a directory on GCP. This is just
-            human-friendly workaround since GCP doesn't support files and catalogs.
-            All objects are stored as blobs and their 'path' is just a name.
+    def download_to_stream(self, remote_path: str, stream: BinaryIO) -> None:
+        """ Streams the content of a file into `stream` (chunk by chunk) """
+        remote_path = self._add_gs(remote_path)
+        blob = self._get_blob(remote_path)
+        blob.download_to_file(stream)
 
-            Note: in some cases it would be probably better to retrieve
-                all blob's names at once (instead of calling the API every single time)
-                and work on locally cached data. It might be dangerous since we
-                would have to update it by hand if there are any changes.
+    def open_for_writing(self, remote_path: str, chunk_size: int = 8 * 1024 ** 2) -> BinaryIO:
+        """ Returns a file-like object that uploads its content in chunks
+            (resumable upload), so big files never have to fit in memory
         """
+        remote_path = self._add_gs(remote_path)
+        self._invalidate_listings(remote_path)
+        return self._get_blob(remote_path).open("wb", chunk_size=chunk_size)
+
+    def _split_directory_path(self, remote_path: str) -> Tuple[str, str]:
         remote_path = self._add_gs(remote_path)
         bucket_name, remote_relative_path = self._split_bucket_path(remote_path)
         if len(remote_relative_path) and not remote_relative_path.endswith("/"):
             remote_relative_path = f"{remote_relative_path}/"
+        return bucket_name, remote_relative_path
+
+    def delete_directory(self, remote_path: str) -> int:
+        """ Deletes all objects under a directory (recursively). Deletions are
+            sent in batches (up to 100 calls per HTTP request).
+
+        Returns:
+            int: Number of deleted objects
+        """
+        bucket_name, prefix = self._split_directory_path(remote_path)
+        if len(prefix) == 0:
+            raise ValueError(f"Refusing to delete the whole bucket: {remote_path}")
+        bucket = self._get_bucket(bucket_name)
+
+        directory = f"gs://{bucket_name}/{prefix}"
+        for listed in list(self._listings.keys()):
+            if listed.startswith(directory) or directory.startswith(listed):
+                self._listings.pop(listed, None)
+
+        num_deleted = 0
+        for page in self.iter_files(remote_path, recursive=True):
+            for idx in range(0, len(page), MAX_CALLS_PER_BATCH):
+                # Note: Objects that have been deleted in the meantime are ignored
+                with self.client.batch(raise_exception=False):
+                    for name in page[idx:idx + MAX_CALLS_PER_BATCH]:
+                        bucket.blob(prefix + name).delete()
+            num_deleted += len(page)
+        return num_deleted
+
+    def _invalidate_listings(self, remote_path: str) -> None:
+        if not self._listings:
+            return
+        for directory in list(self._listings.keys()):
+            if remote_path.startswith(directory):
+                self._listings.pop(directory, None)
+
+    def iter_files(self, remote_path: str, recursive: bool = False,
+                   page_size: int = 1000, match_glob: str = None) -> Iterator[List[str]]:
+        """ Lazily lists a directory on GCP, one page of results at a time.
+            Only objects under the directory's prefix are requested. Unless
+            `recursive` is set, sub-directories are returned as a single item
+            (their name) thanks to the "/" delimiter.
+
+            Args:
+                remote_path (str): Path to the directory
+                recursive (bool): Lists all nested objects instead of the
+                    first level only
+                page_size (int): Max number of items per page (API call)
+                match_glob (str): Optional glob that the object names have to match
+
+            Yields:
+                List[str]: Paths relative to `remote_path`
+        """
+        bucket_name, prefix = self._split_directory_path(remote_path)
+        iterator = self.client.list_blobs(
+            self._get_bucket(bucket_name), prefix=prefix,
+            delimiter=None if recursive else "/", page_size=page_size,
+            match_glob=match_glob, fields="items(name),prefixes,nextPageToken"
+        )
+        for page in iterator.pages:
+            items = [blob.name[len(prefix):] for blob in page]
+            items.extend(sub_prefix[len(prefix):].rstrip("/") for sub_prefix in page.prefixes)
+            yield items
+
+    def list_files(self, remote_path: str) -> Set[str]:
+        """ Lists all files that are inside a directory on GCP. This is just
+            human-friendly workaround since GCP doesn't support files and catalogs.
+            All objects are stored as blobs and their 'path' is just a name.
+
+            Note: The listing is prefix-based, so its cost depends on the size
+                of the directory only. If `listing_cache_ttl` is set, results
+                are reused for that many seconds (writes made through this client
+                invalidate them).
+        """
+        directory = self._add_gs(remote_path).rstrip("/") + "/"
+        if self.listing_cache_ttl > 0:
+            expires_at, items = self._listings.get(directory, (0, None))
+            if time.monotonic() < expires_at:
+                return set(items)
+
+        items = set()
+        for page in self.iter_files(remote_path):
+            items.update(item for item in page if item)
 
-        bucket = self.client.get_bucket(bucket_name)
-        objects = [blob.name[len(remote_relative_path):] for blob in bucket.list_blobs()
-                   if blob.name.startswith(remote_relative_path)]
-        items = set([object.split("/")[0] for object in objects])
-        return items
+        if self.listing_cache_ttl > 0:
+            self._listings[directory] = (time.monotonic() + self.listing_cache_ttl, items)
+        return set(items)
 
     def copy_file(self, src_remote_path: str, dst_remote_path: str) -> None:
         src_remote_path = self._add_gs(src_remote_path)
@@ -110,9 +241,10 @@ class CloudStorageClient:
 
         src_bucket_name, src_relative_path = self._split_bucket_path(src_remote_path)
         dst_bucket_name, dst_relative_path = self._split_bucket_path(dst_remote_path)
-        src_bucket = self.client.get_bucket(src_bucket_name)
-        dst_bucket = self.client.get_bucket(dst_bucket_name)
+        src_bucket = self._get_bucket(src_bucket_name)
+        dst_bucket = self._get_bucket(dst_bucket_name)
         src_blob = src_bucket.blob(src_relative_path)
+        self._invalidate_listings(dst_remote_path)
         src_bucket.copy_blob(src_blob, dst_bucket, dst_relative_path)
 
     def with_uri(self, path: str) -> str:
@@ -124,4 +256,5 @@ class CloudStorageClient:
     def delete_file(self, remote_path: str) -> None:
         remote_path = self._add_gs(remote_path)
         blob = self._get_blob(remote_path)
+        self._invalidate_listings(remote_path)
         blob.delete()
\ No newline at end of file
@@ -1,12 +1,111 @@
 from collections import defaultdict
+from typing import Dict, List
+import pandas as pd
 import plotly.graph_objects as go
 import plotly.express as px
-from scheduler.datastructures import Experiment, Scenario, JobStatus
+from plotly.subplots import make_subplots
+from scheduler.datastructures import Experiment, JobStatus
 
 
-def render_gantt_chart(scenario: Scenario):
-    fig = px.timeline(scenario.results, x_start="Start", x_end="Finish", y="Task",
-                      color="Resource", title="Gantt Chart", hover_data="Hoverdata")
+# Above this number of tasks (after filtering) bars are aggregated
+MAX_DETAILED_BARS = 2000
+
+# Number of time buckets that the (visible) time window is split into
+# in the aggregated view: gaps shorter than a bucket are not drawn
+AGGREGATION_BUCKETS = 500
+
+
+def _results_to_frame(results: List[Dict]) -> pd.DataFrame:
+    frame = pd.DataFrame(results, columns=["Task", "Resource", "Start", "Finish", "Hoverdata"])
+    frame["Start"] = pd.to_datetime(frame["Start"])
+    frame["Finish"] = pd.to_datetime(frame["Finish"])
+    return frame
+
+
+def get_gantt_dimensions(results: List[Dict]) -> Dict:
+    """ Machines, jobs and the time span of a schedule (e.g. for filters) """
+    frame = _results_to_frame(results)
+    return {
+        "machines": sorted(frame["Task"].unique()),
+        "jobs": sorted(frame["Resource"].unique()),
+        "start": frame["Start"].min(),
+        "finish": frame["Finish"].max(),
+    }
+
+
+def _aggregate_busy_blocks(frame: pd.DataFrame, resolution: pd.Timedelta) -> pd.DataFrame:
+    """ Merges tasks of the same machine that overlap (or are closer than
+        `resolution`) into a single block
+    """
+    frame = frame.sort_values(["Task", "Start"])
+    busy_until = frame.groupby("Task")["Finish"].cummax()
+    previous_busy_until = busy_until.groupby(frame["Task"]).shift()
+    new_block = previous_busy_until.isna() | (frame["Start"] > previous_busy_until + resolution)
+    return frame.groupby(["Task", new_block.cumsum()]).agg(
+        Start=("Start", "min"), Finish=("Finish", "max"), Tasks=("Start", "size")
+    ).reset_index(level=0)
+
+
+def render_gantt_chart(results: List[Dict], machines: List[str] | None = None,
+                       jobs: List[str] | None = None, time_window: tuple | None = None,
+                       max_bars: int = MAX_DETAILED_BARS):
+    """ Gantt chart with one trace per machine. Small schedules (or their
+        filtered parts) show every task colored by its job (with a legend of
+        jobs). Bigger ones show busy blocks of machines - zoom in with
+        `time_window`, `machines` or `jobs` to see individual tasks.
+
+    Args:
+        results (List[Dict]): Scenario's results (`results.json`)
+        machines (List[str]): Show only these machines (all if None)
+        jobs (List[str]): Show only these jobs (all if None)
+        time_window (tuple): Show only tasks that overlap (start, finish)
+        max_bars (int): Max number of tasks drawn one by one
+    """
+    frame = _results_to_frame(results)
+    if machines:
+        frame = frame[frame["Task"].isin(machines)]
+    if jobs:
+        frame = frame[frame["Resource"].isin(jobs)]
+    if time_window is not None:
+        window_start, window_finish = pd.Timestamp(time_window[0]), pd.Timestamp(time_window[1])
+        frame = frame[(frame["Finish"] > window_start) & (frame["Start"] < window_finish)]
+
+    fig = go.Figure()
+    aggregated = len(frame) > max_bars
+
+    if aggregated:
+        span = frame["Finish"].max() - frame["Start"].min()
+        frame = _aggregate_busy_blocks(frame, span / AGGREGATION_BUCKETS)
+        frame["Hoverdata"] = frame["Tasks"].astype(str) + " tasks"
+        colors = {}
+    else:
+        palette = px.colors.qualitative.Plotly
+        colors = {job: palette[idx % len(palette)]
+                  for idx, job in enumerate(sorted(frame["Resource"].unique()))}
+        frame = frame.assign(Hoverdata=frame["Resource"] + "<br>" + frame["Hoverdata"])
+
+    for machine, tasks in frame.groupby("Task", sort=True):
+        durations = (tasks["Finish"] - tasks["Start"]).dt.total_seconds() * 1000
+        fig.add_trace(go.Bar(
+            y=[machine] * len(tasks), x=durations, base=tasks["Start"],
+            orientation="h", name=machine, hovertext=tasks["Hoverdata"],
+            hoverinfo="text+y", showlegend=False,
+            marker_color=tasks["Resource"].map(colors) if len(colors) else None
+        ))
+
+    # Note: Bars are grouped by machines, so jobs' colors are explained by
+    #       legend-only entries (they don't draw anything, so clicking them
+    #       is disabled).
+    for job, color in colors.items():
+        fig.add_trace(go.Scatter(
+            x=[None], y=[None], mode="markers", name=job, legendgroup=job,
+            showlegend=True, marker=dict(color=color, symbol="square", size=10)
+        ))
+
+    title = "Gantt Chart" + (" (machines' busy time, zoom in for tasks)" if aggregated else "")
+    fig.update_layout(title=title, barmode="overlay", showlegend=not aggregated, bargap=0.2,
+                      legend=dict(title="Jobs", itemclick=False, itemdoubleclick=False))
+    fig.update_xaxes(type="date")
     fig.update_yaxes(categoryorder="category descending")
     return fig
 
@@ -47,4 +146,46 @@ def render_radar_plot(experiment: Experiment):
         showlegend=True
     )
 
-    return fig
\ No newline at end of file
+    return fig
+
+def render_timings_breakdown(breakdowns: Dict[str, Dict[str, float]]):
+    """ Stacked bars: where the wall-clock time of each scenario goes """
+    stages = []
+    for breakdown in breakdowns.values():
+        stages += [stage for stage in breakdown if stage not in stages]
+
+    fig = go.Figure()
+    for stage in stages:
+        fig.add_trace(go.Bar(
+            y=list(breakdowns.keys()),
+            x=[breakdown.get(stage, 0) for breakdown in breakdowns.values()],
+            name=stage, orientation="h"
+        ))
+    fig.update_layout(barmode="stack", xaxis_title="Seconds", showlegend=True)
+    return fig
+
+
+def render_overview_chart(summary: Dict):
+    """ Overview of a schedule built from its aggregates (`summary.json`):
+        load of machines over time and their overall utilization
+    """
+    machines = [row["machine"] for row in summary["machines"]]
+    buckets = [round(idx * summary["bucket_size"], 1) for idx in range(len(summary["load"][0]))] \
+        if len(summary["load"]) else []
+
+    fig = make_subplots(rows=1, cols=2, shared_yaxes=True, column_widths=[0.8, 0.2],
+                        horizontal_spacing=0.02)
+    fig.add_trace(go.Heatmap(z=summary["load"], x=buckets, y=machines, zmin=0, zmax=1,
+                             colorscale="Blues", colorbar=dict(title="Load", x=-0.15),
+                             hovertemplate="%{y}<br>From: %{x}<br>Load: %{z}<extra></extra>"),
+                  row=1, col=1)
+    fig.add_trace(go.Bar(x=[row["utilization"] for row in summary["machines"]], y=machines,
+                         orientation="h", name="Utilization",
+                         hovertext=[f"{row['num_tasks']} tasks, {row['idle_gaps']} idle gaps "
+                                    f"(max: {row['idle_gap_max']})" for row in summary["machines"]]),
+                  row=1, col=2)
+    fig.update_layout(title="Schedule overview", showlegend=False)
+    fig.update_xaxes(title_text="Time", row=1, col=1)
+    fig.update_xaxes(title_text="Utilization", range=[0, 1], row=1, col=2)
+    fig.update_yaxes(categoryorder="category descending")
+    return fig
@@ -0,0 +1,166 @@
+import json
+from typing import Dict, Iterable, List, Set, Tuple
+
+from scheduler.googlecloudplatform import DatastoreClient, JobStatus
+from scheduler.googlecloudplatform.datastore import MAX_IN_FILTER_VALUES
+from scheduler.datastructures import Experiment, Scenario
+
+
+class ExperimentIndex:
+    """ Persists experiments and their scenarios in Datastore, so they survive
+        restarts of the app. Both are stored as separate entity kinds:
+
+        * `<entity_name>` - experiments (key: experiment name)
+        * `<entity_name>-scenarios` - scenarios (key: Batch job name)
+
+        Only properties used in queries are indexed: `created_at`/`status` of
+        experiments and `experiment_name`/`status` of scenarios.
+    """
+
+    EXPERIMENT_UNINDEXED = ("experiment_name", "instance_hash")
+    SCENARIO_UNINDEXED = ("scenario_name", "params", "remote_data_path",
+                          "metrics", "position", "reuse_key", "reused_from",
+                          "solver_args", "submitted", "priority", "estimated_cost", "sizing",
+                          "timings", "solver_phases", "batch_array_job", "batch_task_index",
+                          "portfolio_size", "pooled")
+
+    def __init__(self, entity_name: str) -> None:
+        self.experiments = DatastoreClient(entity_name)
+        self.scenarios = DatastoreClient(f"{entity_name}-scenarios", max_parallel_requests=4)
+
+    def _experiment_to_entity(self, experiment: Experiment) -> Dict:
+        return {
+            "experiment_name": experiment.experiment_name,
+            "status": int(experiment.status),
+            "created_at": experiment.created_at,
+            "instance_hash": experiment.instance_hash,
+        }
+
+    def _scenario_to_entity(self, experiment: Experiment, scenario: Scenario,
+                            position: int) -> Dict:
+        return {
+            "experiment_name": experiment.experiment_name,
+            "scenario_name": scenario.scenario_name,
+            "params": json.dumps(scenario.params),
+            "remote_data_path": scenario.remote_data_path,
+            "metrics": json.dumps(scenario.metrics),
+            "status": int(scenario.status),
+            "position": position,
+            "reuse_key": scenario.reuse_key,
+            "reused_from": scenario.reused_from,
+            "solver_args": scenario.solver_args,
+            "submitted": scenario.submitted,
+            "priority": scenario.priority,
+            "estimated_cost": scenario.estimated_cost,
+            "sizing": json.dumps(scenario.sizing),
+            "timings": json.dumps(scenario.timings),
+            "solver_phases": json.dumps(scenario.solver_phases),
+            "batch_array_job": scenario.batch_array_job,
+            "batch_task_index": scenario.batch_task_index,
+            "portfolio_size": scenario.portfolio_size,
+            "pooled": scenario.pooled,
+        }
+
+    def _scenario_from_entity(self, entity) -> Scenario:
+        return Scenario(
+            scenario_name=entity["scenario_name"],
+            batch_job_name=entity.key.name,
+            params=json.loads(entity["params"]),
+            remote_data_path=entity["remote_data_path"],
+            metrics=json.loads(entity["metrics"]),
+            status=JobStatus.State(entity["status"]),
+            reuse_key=entity.get("reuse_key"),
+            reused_from=entity.get("reused_from"),
+            solver_args=list(entity.get("solver_args") or []),
+            submitted=entity.get("submitted", True),
+            priority=entity.get("priority", 0),
+            estimated_cost=entity.get("estimated_cost", 0),
+            sizing=json.loads(entity.get("sizing") or "{}"),
+            timings=json.loads(entity.get("timings") or "{}"),
+            solver_phases=json.loads(entity.get("solver_phases") or "{}"),
+            batch_array_job=entity.get("batch_array_job"),
+            batch_task_index=entity.get("batch_task_index"),
+            portfolio_size=entity.get("portfolio_size", 1),
+            pooled=entity.get("pooled", False),
+        )
+
+    def save_experiment(self, experiment: Experiment) -> None:
+        self.experiments.update(experiment.experiment_name,
+                                self._experiment_to_entity(experiment),
+                                _to_exclude=self.EXPERIMENT_UNINDEXED)
+        self.scenarios.batch_insert(
+            [self._scenario_to_entity(experiment, scenario, position)
+             for position, scenario in enumerate(experiment.scenarios)],
+            ids=[scenario.batch_job_name for scenario in experiment.scenarios],
+            _to_exclude=self.SCENARIO_UNINDEXED
+        )
+
+    def save_scenarios(self, experiment: Experiment, scenarios: List[Scenario]) -> None:
+        self.scenarios.update_multi(
+            {scenario.batch_job_name: self._scenario_to_entity(
+                experiment, scenario, experiment.scenarios.index(scenario))
+             for scenario in scenarios},
+            _to_exclude=self.SCENARIO_UNINDEXED
+        )
+
+    def save_experiment_status(self, experiment: Experiment) -> None:
+        self.experiments.update(experiment.experiment_name,
+                                {"status": int(experiment.status)},
+                                _to_exclude=self.EXPERIMENT_UNINDEXED)
+
+    def delete_experiment(self, experiment: Experiment) -> None:
+        self.scenarios.delete_multi([scenario.batch_job_name
+                                     for scenario in experiment.scenarios])
+        self.experiments.delete(experiment.experiment_name)
+
+    def _attach_scenarios(self, experiments: Dict[str, Experiment]) -> None:
+        names = list(experiments.keys())
+        for idx in range(0, len(names), MAX_IN_FILTER_VALUES):
+            chunk = names[idx:idx + MAX_IN_FILTER_VALUES]
+            entities = sorted(self.scenarios.list_all(filter=["experiment_name", "IN", chunk]),
+                              key=lambda entity: entity["position"])
+            for entity in entities:
+                experiments[entity["experiment_name"]].scenarios.append(
+                    self._scenario_from_entity(entity))
+
+    def _experiments_from_entities(self, entities: Iterable) -> List[Experiment]:
+        experiments = {
+            entity.key.name: Experiment(
+                experiment_name=entity["experiment_name"],
+                status=JobStatus.State(entity["status"]),
+                created_at=entity["created_at"],
+                instance_hash=entity.get("instance_hash"),
+            )
+            for entity in entities
+        }
+        if len(experiments):
+            self._attach_scenarios(experiments)
+        return list(experiments.values())
+
+    def load_experiments(self, cursor: bytes | None = None, page_size: int = 20
+                         ) -> Tuple[List[Experiment], bytes | None]:
+        """ Loads a single page of experiments (the newest first) with their scenarios.
+
+        Returns:
+            Tuple[List[Experiment], bytes | None]: Experiments and the cursor
+                that points to the next page (None if there are no more pages)
+        """
+        entities, next_cursor = self.experiments.list_batch(
+            order="-created_at", batch_size=page_size, cursor=cursor)
+        entities = list(entities)
+        experiments = self._experiments_from_entities(entities)
+        return experiments, (next_cursor if len(entities) else None)
+
+    def load_experiments_by_name(self, names: Iterable[str]) -> List[Experiment]:
+        return self._experiments_from_entities(self.experiments.get_multi(list(names)))
+
+    def has_experiment(self, experiment_name: str) -> bool:
+        return self.experiments.get(experiment_name) is not None
+
+    def list_unfinished_experiment_names(self) -> Set[str]:
+        """ Uses the index on scenarios' status to find experiments that are
+            still running, no matter how old they are.
+        """
+        entities = self.scenarios.list_all(
+            filter=["status", "<", int(JobStatus.State.SUCCEEDED)])
+        return {entity["experiment_name"] for entity in entities}
@@ -0,0 +1,239 @@
+import re
+import codecs
+import hashlib
+from dataclasses import dataclass
+from typing import Any, BinaryIO, Dict, Iterator, List, Tuple
+
+
+@dataclass
+class Instance:
+    """ Basic description of a problem instance (`jobs.json`) """
+    content_hash: str
+    job_hashes: List[str]
+    num_jobs: int
+    num_tasks: int
+    num_alternatives: int
+    num_machines: int
+    total_min_duration: int
+    horizon: int
+
+
+# Note: The structure is fixed: jobs -> tasks -> alternatives -> [duration, machine]
+JOBS_DEPTH = 4
+JSON_WHITESPACE = b" \t\n\r"
+
+# Note: Well-formed jobs (or tasks) without leading zeros are matched as single
+#       tokens (the fast path), anything else falls back to brackets, commas
+#       and values.
+_WS = rb"[ \t\n\r]*"
+_NUMBER = rb"(?:0|[1-9]\d*)"
+_PAIR = rb"\[" + _WS + _NUMBER + _WS + rb"," + _WS + _NUMBER + _WS + rb"\]"
+_TASK = rb"\[" + _WS + _PAIR + rb"(?:" + _WS + rb"," + _WS + _PAIR + rb")*" + _WS + rb"\]"
+_JOB = rb"\[" + _WS + _TASK + rb"(?:" + _WS + rb"," + _WS + _TASK + rb")*" + _WS + rb"\]"
+_SIMPLE = rb"[\[\],]|[^ \t\n\r\[\],]+"
+_TOKEN = re.compile(_WS + rb"(" + _JOB + rb"|" + _TASK + rb"|" + _SIMPLE + rb")")
+_SIMPLE_TOKEN = re.compile(_WS + rb"(" + _SIMPLE + rb")")
+# Note: The same grammar as the fast path (JSON doesn't allow leading zeros)
+_INTEGER = re.compile(_NUMBER)
+_DURATIONS = re.compile(rb"(?:^|\[)(\d+),")
+_MACHINES = re.compile(rb",(\d+)\]")
+
+EMPTY_LEVEL_ERRORS = ["", "There are no jobs", "A job has no tasks",
+                      "A task has no alternatives", "An alternative is empty"]
+
+
+class InvalidInstanceError(ValueError):
+    """ The uploaded `jobs.json` doesn't have the required structure """
+
+    def __init__(self, message: str, offset: int) -> None:
+        super().__init__(f"{message} (at byte {offset})")
+        self.offset = offset
+
+
+def _hash(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()
+
+
+def _tokenize(stream: BinaryIO, chunk_size: int) -> Iterator[Tuple[bytes, int]]:
+    """ Yields tokens (tasks, brackets, commas and values) with their offsets """
+    # Note: A BOM (which some editors add) is skipped, as `json.loads` does.
+    #       Offsets still point into the uploaded file.
+    offset, tail = 0, stream.read(len(codecs.BOM_UTF8))
+    if tail == codecs.BOM_UTF8:
+        offset, tail = len(tail), b""
+    while True:
+        chunk = stream.read(chunk_size)
+        data = tail + chunk
+        tail = b""
+        for match in _TOKEN.finditer(data):
+            # Note: A value at the end of a chunk can continue in the next one
+            if chunk and match.end() == len(data) and match.group(1) not in (b"[", b"]", b","):
+                tail = match.group(0)
+                break
+            yield match.group(1), offset + match.start(1)
+        offset += len(data) - len(tail)
+        if not chunk:
+            return
+
+
+class _JobsParser:
+    """ A push parser of `jobs.json` that builds its canonical form and
+        statistics on the fly (see `parse_jobs`)
+    """
+
+    def __init__(self) -> None:
+        self.canonical = bytearray()
+        self.job_hashes = []
+        self.num_tasks = self.num_alternatives = 0
+        self.total_min_duration = self.horizon = 0
+        self.machines = set()
+
+        self.depth, self.expect_value, self.finished = 0, True, False
+        self.counts = [0] * (JOBS_DEPTH + 1)
+        self.job_start, self.alternative, self.durations = 0, [], []
+
+    def _add_task(self, durations: List[int]) -> None:
+        self.num_tasks += 1
+        self.total_min_duration += min(durations)
+        self.horizon += max(durations)
+
+    def _add_tasks(self, tasks: bytes) -> None:
+        """ Adds canonical tasks (a job or a single task) matched as a whole """
+        for task in tasks[1:-1].split(b"]],[["):
+            self._add_task(list(map(int, _DURATIONS.findall(task))))
+        machines = _MACHINES.findall(tasks)
+        self.machines.update(map(int, machines))
+        self.num_alternatives += len(machines)
+
+    def feed(self, token: bytes, offset: int) -> None:
+        if self.finished:
+            raise InvalidInstanceError("Unexpected content after the list of jobs", offset)
+
+        if len(token) > 1 and token[:1] == b"[":
+            # Note: A job is expected at depth 1, a task at depth 2
+            canonical = token.translate(None, JSON_WHITESPACE)
+            level = 1 if canonical[:3] == b"[[[" else 2
+            if self.depth != level or not self.expect_value:
+                for match in _SIMPLE_TOKEN.finditer(token):
+                    self.feed(match.group(1), offset + match.start(1))
+                return
+            if level == 1:
+                self.job_hashes.append(_hash(canonical)[:16])
+            self._add_tasks(canonical if level == 2 else canonical[1:-1])
+            self.canonical += canonical
+            self.counts[level] += 1
+            self.expect_value = False
+
+        elif token == b"[":
+            if not self.expect_value:
+                raise InvalidInstanceError("Expected ',' or ']'", offset)
+            if self.depth == JOBS_DEPTH:
+                raise InvalidInstanceError("An alternative has to be [duration, machine]", offset)
+            self.depth += 1
+            self.counts[self.depth] = 0
+            if self.depth == 2:
+                self.job_start = len(self.canonical)
+            self.canonical += b"["
+
+        elif token == b",":
+            if self.expect_value or self.depth == 0:
+                raise InvalidInstanceError("Unexpected ','", offset)
+            self.expect_value = True
+            self.canonical += b","
+
+        elif token == b"]":
+            if self.depth == 0 or (self.expect_value and self.counts[self.depth] > 0):
+                raise InvalidInstanceError("Unexpected ']'", offset)
+            if self.counts[self.depth] == 0:
+                raise InvalidInstanceError(EMPTY_LEVEL_ERRORS[self.depth], offset)
+            self.canonical += b"]"
+
+            if self.depth == JOBS_DEPTH:
+                if len(self.alternative) != 2:
+                    raise InvalidInstanceError(
+                        "An alternative has to be [duration, machine]", offset)
+                self.durations.append(self.alternative[0])
+                self.machines.add(self.alternative[1])
+                self.num_alternatives += 1
+                self.alternative = []
+            elif self.depth == 3:
+                self._add_task(self.durations)
+                self.durations = []
+            elif self.depth == 2:
+                self.job_hashes.append(_hash(bytes(self.canonical[self.job_start:]))[:16])
+            else:
+                self.finished = True
+
+            self.depth -= 1
+            self.counts[self.depth] += 1
+            self.expect_value = False
+
+        else:
+            if self.depth != JOBS_DEPTH or not self.expect_value:
+                raise InvalidInstanceError(f"Unexpected value {token[:20]!r}", offset)
+            if not _INTEGER.fullmatch(token):
+                raise InvalidInstanceError(
+                    f"Durations and machines have to be non-negative integers "
+                    f"(without leading zeros), got {token[:20]!r}", offset)
+            value = int(token)
+            self.alternative.append(value)
+            self.counts[self.depth] += 1
+            self.expect_value = False
+            self.canonical += str(value).encode()
+
+
+def parse_jobs(stream: BinaryIO, chunk_size: int = 1024 ** 2) -> Tuple[bytes, Instance]:
+    """ Validates `jobs.json` in a single pass (without loading it as Python
+        objects) and returns its canonical, compact form together with its
+        description. An invalid file is rejected at its first error.
+
+        The canonical form doesn't depend on the formatting of the uploaded
+        file. Its hash identifies the instance, and hashes of single jobs are
+        used to find similar instances (e.g. the same jobs with a few of them
+        added or removed).
+
+    Args:
+        stream (BinaryIO): Content of `jobs.json`
+        chunk_size (int): Number of bytes read at once
+
+    Raises:
+        InvalidInstanceError: If the content isn't a list of jobs, each being
+            a list of tasks, each being a list of [duration, machine] pairs
+            (non-negative integers)
+    """
+    parser, offset = _JobsParser(), 0
+    for token, offset in _tokenize(stream, chunk_size):
+        parser.feed(token, offset)
+
+    if not parser.finished:
+        raise InvalidInstanceError("Unexpected end of the file", offset)
+
+    canonical = bytes(parser.canonical)
+    return canonical, Instance(
+        content_hash=_hash(canonical),
+        job_hashes=parser.job_hashes,
+        num_jobs=len(parser.job_hashes),
+        num_tasks=parser.num_tasks,
+        num_alternatives=parser.num_alternatives,
+        num_machines=len(parser.machines),
+        total_min_duration=parser.total_min_duration,
+        horizon=parser.horizon,
+    )
+
+
+def normalize_parameters(parameters: Dict[str, Any]) -> Dict[str, Any]:
+    """ Normalizes scenario's parameters so that equal parameters are
+        always serialized in the same way. The scenario's name is skipped
+        since it doesn't affect the solution.
+    """
+    normalized = {}
+    for name, value in parameters.items():
+        if name == "name":
+            continue
+        if hasattr(value, "item"):
+            # Note: numpy scalars (e.g. values read with pandas)
+            value = value.item()
+        if isinstance(value, float) and value.is_integer():
+            value = int(value)
+        normalized[name] = value
+    return normalized
@@ -0,0 +1,89 @@
+import json
+import logging
+from threading import Lock
+from typing import Dict, Set
+
+from scheduler.googlecloudplatform import CloudStorageClient
+
+STATUS_MARKER_NAME = "status.json"
+
+
+class StatusMarkerListener:
+    """ Finds `status.json` markers written by the solver as its last step.
+
+        Only directories of experiments with watched scenarios (the ones that
+        haven't finished yet) are listed (names only), one listing per
+        experiment, so the cost doesn't grow with the number of past
+        experiments. Markers are downloaded only for watched scenarios and
+        only once per watch.
+
+    Args:
+        storage (CloudStorageClient): Storage client
+        root_path (str): Directory that contains all scenarios' directories
+    """
+
+    def __init__(self, storage: CloudStorageClient, root_path: str) -> None:
+        self.storage = storage
+        self.root_path = root_path.rstrip("/")
+        self._watched: Set[str] = set()
+        self._reported: Set[str] = set()
+        self._lock = Lock()
+
+    def watch(self, scenario_path: str) -> None:
+        with self._lock:
+            self._watched.add(scenario_path.rstrip("/"))
+
+    def unwatch(self, scenario_path: str) -> None:
+        with self._lock:
+            self._watched.discard(scenario_path.rstrip("/"))
+            self._reported.discard(scenario_path.rstrip("/"))
+
+    def reset(self, scenario_path: str) -> None:
+        """ Scenario's marker will be returned again by the next poll (e.g. if
+            it couldn't be processed)
+        """
+        with self._lock:
+            self._reported.discard(scenario_path.rstrip("/"))
+
+    def poll(self) -> Dict[str, Dict]:
+        """ Returns new markers of the watched scenarios. Once a marker of a
+            scenario has been returned, it's not downloaded again (Batch is
+            the fallback for markers that get overwritten, e.g. by a retry).
+
+        Returns:
+            Dict[str, Dict]: Scenario's remote path -> content of its marker
+        """
+        with self._lock:
+            watched = self._watched - self._reported
+
+        if len(watched) == 0:
+            return {}
+
+        # Note: Scenario's directory is `<root>/<experiment>/<scenario>`
+        experiment_paths = {scenario_path.rsplit("/", 1)[0] for scenario_path in watched}
+
+        markers = {}
+        for experiment_path in sorted(experiment_paths):
+            try:
+                markers.update(self._poll_experiment(experiment_path, watched))
+            except Exception as error:
+                logging.warning(f"Cannot list status markers of {experiment_path}: {error}")
+        return markers
+
+    def _poll_experiment(self, experiment_path: str, watched: Set[str]) -> Dict[str, Dict]:
+        markers = {}
+        suffix = f"/{STATUS_MARKER_NAME}"
+        for page in self.storage.iter_files(experiment_path, recursive=True,
+                                            match_glob=f"**{suffix}"):
+            for item in page:
+                scenario_path = f"{experiment_path}/{item[:-len(suffix)]}"
+                if scenario_path not in watched:
+                    continue
+                try:
+                    markers[scenario_path] = self.storage.download_content(
+                        f"{scenario_path}{suffix}", json.loads)
+                    with self._lock:
+                        self._reported.add(scenario_path)
+                except Exception as error:
+                    logging.warning(f"Cannot read a status marker of {scenario_path}: {error}")
+        return markers
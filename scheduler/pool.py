@@ -0,0 +1,131 @@
+import json
+import logging
+from threading import Lock
+from typing import Callable, Dict
+from uuid import uuid4
+
+from google.api_core.exceptions import NotFound
+
+from scheduler.googlecloudplatform import BatchClient, CloudStorageClient
+from scheduler.datastructures import Scenario
+
+# Layout of the queue (see `solver/worker.py`)
+QUEUE_TASKS_DIR = "tasks"
+QUEUE_CLAIMS_DIR = "claims"
+
+
+class SolverPool:
+    """ A pool of long-running solver workers (tasks of a single Batch job)
+        that solve small scenarios back to back. Scenarios are handed over
+        through task files in a queue directory on the storage, and results
+        come back as usual (files and a status marker in the scenario's
+        directory).
+
+        The pool's job is started with the first task and its workers stop on
+        their own once the queue has been empty for a while. A new job is
+        started when there are tasks again.
+    """
+
+    def __init__(self, storage: CloudStorageClient, batch: BatchClient, queue_path: str,
+                 start_workers: Callable[[str], None],
+                 on_stopped: Callable[[str], None] | None = None) -> None:
+        """
+        Args:
+            storage (CloudStorageClient): Storage client
+            batch (BatchClient): Batch client
+            queue_path (str): Path to the queue's directory
+            start_workers (Callable[[str], None]): Starts the pool's Batch job
+                with the given name
+            on_stopped (Callable[[str], None]): Called with the name of the
+                pool's job once it has finished (or disappeared)
+        """
+        self.storage = storage
+        self.batch = batch
+        self.queue_path = queue_path
+        self._start_workers = start_workers
+        self._on_stopped = on_stopped
+        self._job_name: str | None = None
+        self._job_active = False
+        self._lock = Lock()
+
+    @property
+    def job_name(self) -> str | None:
+        """ Name of the pool's current Batch job (None if it hasn't been started yet) """
+        return self._job_name
+
+    def _get_task_path(self, scenario: Scenario) -> str:
+        return f"{self.queue_path}/{QUEUE_TASKS_DIR}/{scenario.batch_job_name}.json"
+
+    def _is_running(self) -> bool:
+        try:
+            return not self.batch.has_finished(self._job_name)
+        except NotFound:
+            return False
+
+    def _check_job(self) -> bool:
+        """ Checks if the pool's job is still running (`on_stopped` is called
+            once it has finished)
+        """
+        if not self._job_active:
+            return False
+        if self._is_running():
+            return True
+        self._job_active = False
+        if self._on_stopped is not None:
+            self._on_stopped(self._job_name)
+        return False
+
+    def refresh(self) -> None:
+        """ Notices that the pool's job has finished (e.g. its workers have
+            been idle), so the capacity it used is released
+        """
+        with self._lock:
+            self._check_job()
+
+    def submit(self, scenario: Scenario, task: Dict) -> None:
+        """ Adds a scenario to the queue and makes sure there are workers to solve it
+
+        Args:
+            scenario (Scenario): Scenario to solve
+            task (Dict): `data_dir` (relative to the pool's mount point) and
+                `options` of the solver
+        """
+        self.storage.upload_content(self._get_task_path(scenario), json.dumps(task),
+                                    overwrite=True)
+        self.ensure_running()
+
+    def ensure_running(self) -> None:
+        """ Starts the pool's job unless it's running already
+
+            Note: Workers that have just decided to stop (after being idle) can
+                  miss a new task, so this is called periodically while there
+                  are unfinished scenarios in the pool.
+        """
+        with self._lock:
+            if not self._check_job():
+                self._job_name = f"solver-pool-{str(uuid4())[:8]}"
+                logging.info(f"Starting workers of the pool ({self._job_name}).")
+                self._start_workers(self._job_name)
+                self._job_active = True
+
+    def get_claim(self, scenario: Scenario) -> Dict | None:
+        """ The claim of a worker that's solving the scenario: `worker`,
+            `attempt`, `claimed_at` and `heartbeat` (None if it's still queued)
+        """
+        try:
+            return self.storage.download_content(
+                f"{self.queue_path}/{QUEUE_CLAIMS_DIR}/{scenario.batch_job_name}", json.loads)
+        except (NotFound, ValueError):
+            # Note: A claim that's being written can't be parsed yet
+            return None
+
+    def remove(self, scenario: Scenario) -> None:
+        """ Removes a scenario from the queue. A scenario that's being solved
+            already is not interrupted (its results are ignored).
+        """
+        for path in (self._get_task_path(scenario),
+                     f"{self.queue_path}/{QUEUE_CLAIMS_DIR}/{scenario.batch_job_name}"):
+            try:
+                self.storage.delete_file(path)
+            except NotFound:
+                pass
@@ -0,0 +1,70 @@
+import json
+import logging
+from typing import Dict
+
+from google.api_core.exceptions import NotFound
+
+from scheduler.googlecloudplatform import CloudStorageClient
+from scheduler.notifications import STATUS_MARKER_NAME
+
+# Workers of a portfolio write their outputs into `<scenario>/portfolio/<worker>/`
+PORTFOLIO_DIR = "portfolio"
+
+# Outputs of the best worker that are copied into the scenario's directory
+# (the last two are written only if a solution has been found)
+PORTFOLIO_ARTIFACTS = ("results.json", "metrics.json")
+OPTIONAL_PORTFOLIO_ARTIFACTS = ("solution.json", "summary.json")
+
+
+def _sort_key(marker: Dict) -> tuple:
+    # Note: Workers that haven't found any solution go last
+    return (marker.get("objective") is None, marker.get("objective") or 0)
+
+
+def aggregate_portfolio(storage: CloudStorageClient, scenario_path: str,
+                        portfolio_size: int) -> Dict | None:
+    """ Chooses the best result of portfolio's workers and makes it the
+        scenario's result: its outputs are copied (on the storage side) into
+        the scenario's directory and the scenario's status marker is written.
+
+    Args:
+        storage (CloudStorageClient): Storage client
+        scenario_path (str): Path to the scenario's directory
+        portfolio_size (int): Number of workers
+
+    Returns:
+        Dict | None: The scenario's status marker (None if no worker has succeeded)
+    """
+    markers = {}
+    for worker_index in range(portfolio_size):
+        worker_path = f"{scenario_path}/{PORTFOLIO_DIR}/{worker_index}"
+        try:
+            marker = storage.download_content(f"{worker_path}/{STATUS_MARKER_NAME}", json.loads)
+        except NotFound:
+            continue
+        if marker["state"] == "SUCCEEDED":
+            markers[worker_index] = marker
+
+    if len(markers) == 0:
+        logging.warning(f"No worker of the portfolio of {scenario_path} has succeeded.")
+        return None
+
+    best_worker = min(markers, key=lambda worker_index: _sort_key(markers[worker_index]))
+    best_path = f"{scenario_path}/{PORTFOLIO_DIR}/{best_worker}"
+    for name in PORTFOLIO_ARTIFACTS:
+        storage.copy_file(f"{best_path}/{name}", f"{scenario_path}/{name}")
+    for name in OPTIONAL_PORTFOLIO_ARTIFACTS:
+        try:
+            storage.copy_file(f"{best_path}/{name}", f"{scenario_path}/{name}")
+        except NotFound:
+            pass
+
+    marker = dict(markers[best_worker])
+    marker["started_at"] = min(marker["started_at"] for marker in markers.values())
+    marker["finished_at"] = max(marker["finished_at"] for marker in markers.values())
+    marker["portfolio"] = {"best_worker": best_worker,
+                           "objectives": {str(worker_index): markers[worker_index].get("objective")
+                                          for worker_index in sorted(markers)}}
+    storage.upload_content(f"{scenario_path}/{STATUS_MARKER_NAME}", json.dumps(marker),
+                           overwrite=True)
+    return marker
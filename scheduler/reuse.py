@@ -0,0 +1,71 @@
+import json
+import hashlib
+import logging
+from typing import Any, Dict
+
+from google.api_core.exceptions import NotFound
+
+from scheduler.googlecloudplatform import CloudStorageClient, DatastoreClient
+from scheduler.instances import normalize_parameters
+
+# Files that are produced by the solver and can be shared between scenarios
+REUSABLE_ARTIFACTS = ("results.json", "metrics.json", "status.json")
+
+# Files that are copied only if they exist (older versions of the solver
+# didn't produce them)
+OPTIONAL_ARTIFACTS = ("summary.json",)
+
+
+class ResultReuseIndex:
+    """ Keeps track of solved scenarios, so identical runs (same instance,
+        parameters and solver) don't have to be solved again.
+
+        Results stay in the directory of the scenario that produced them,
+        and a Datastore entity (`<entity_name>-results`, key: reuse key)
+        points to it.
+    """
+
+    def __init__(self, entity_name: str, storage: CloudStorageClient) -> None:
+        self.storage = storage
+        self.datastore = DatastoreClient(f"{entity_name}-results")
+
+    def get_key(self, instance_hash: str, parameters: Dict[str, Any],
+                solver_version: str) -> str:
+        parameters = json.dumps(normalize_parameters(parameters), sort_keys=True)
+        content = "/".join([instance_hash, parameters, solver_version])
+        return hashlib.sha256(content.encode()).hexdigest()
+
+    def register(self, key: str, remote_data_path: str) -> None:
+        self.datastore.update(key, {"remote_data_path": remote_data_path},
+                              _to_exclude=("remote_data_path",))
+
+    def forget(self, key: str) -> None:
+        self.datastore.delete(key)
+
+    def link(self, key: str, remote_data_path: str) -> str | None:
+        """ Copies artifacts of a solved scenario (if there is one) into
+            `remote_data_path`. Copies are made on the storage side.
+
+        Returns:
+            str | None: Path to the scenario that was reused
+        """
+        entity = self.datastore.get(key)
+        if entity is None:
+            return None
+
+        source_path = entity["remote_data_path"]
+        try:
+            for name in REUSABLE_ARTIFACTS:
+                self.storage.copy_file(f"{source_path}/{name}", f"{remote_data_path}/{name}")
+        except NotFound:
+            logging.info(f"Results of {source_path} don't exist anymore. Cannot reuse them.")
+            self.forget(key)
+            return None
+
+        for name in OPTIONAL_ARTIFACTS:
+            try:
+                self.storage.copy_file(f"{source_path}/{name}", f"{remote_data_path}/{name}")
+            except NotFound:
+                pass
+
+        return source_path
@@ -1,28 +1,106 @@
 import time
 import json
 import string
+import logging
+import hashlib
+import zipfile
+from functools import cached_property
+from dataclasses import asdict
+from datetime import datetime
 from uuid import uuid4
-import pandas as pd
-from io import StringIO
-from threading import Thread
-from typing import Any, Dict, List
+from io import BytesIO, StringIO
+from threading import Lock, Thread
+from typing import Any, Callable, Dict, List
+from google.api_core.exceptions import AlreadyExists, NotFound
 
 from scheduler.names import get_random_name
-from scheduler import graphs
+from scheduler import telemetry
+from scheduler.export import EXPORT_FORMATS
+from scheduler.cache import ResultsCache, get_shared_results_cache
+from scheduler.index import ExperimentIndex
+from scheduler.notifications import StatusMarkerListener
+from scheduler.reuse import ResultReuseIndex
+from scheduler.warmstart import WarmStartLibrary
+from scheduler.admission import AdmissionQueue
+from scheduler.sizing import InstanceFeatures, MachineSizer, TIME_BUDGET_FRACTION
+from scheduler.portfolio import aggregate_portfolio
+from scheduler.pool import SolverPool
+from scheduler.instances import Instance, parse_jobs
 from scheduler.googlecloudplatform import \
-    BatchClient, CloudStorageClient, DatastoreClient, JobStatus, \
+    BatchClient, CloudStorageClient, JobStatus, \
     CloudBuildClient, ArtifactsRegistryClient
 from scheduler.datastructures import Experiment, Scenario
 
 
 SCHEDULER_ZIP_LOCAL = "artifacts/scheduler.zip"
-SCHEDULER_ZIP_REMOTE = "f33-solutions/files/scheduler.zip"
+SCHEDULER_ZIP_REMOTE = "f33-solutions/files/scheduler-{version}.zip"
+
+# Note: Bump the version if the way Gantt charts are built changes
+#       (persisted figures of the old version are ignored then).
+GANTT_FIGURE_NAME = "gantt-v2.json"
+
+# Note: Preemptions of Spot VMs count as failures, so tasks running on them
+#       get more retries (the solver resumes from its checkpoint).
+TASK_MAX_RETRY = 2
+SPOT_TASK_MAX_RETRY = 6
+
+# Tasks of an array job find their scenarios in this file (in the experiment's directory)
+ARRAY_JOB_MANIFEST = "manifest.json"
+
+# Workers of the pool take scenarios from this directory (next to `experiments/`)
+POOL_QUEUE_DIR = "pool"
+
+# Workers of the pool don't take new scenarios after this time (in seconds),
+# so a long-running pool's VMs are replaced from time to time
+POOL_MAX_LIFETIME = 6 * 3600
+
+# A scenario of the pool fails if it hasn't finished within this multiple
+# of `batch_task_max_duration` since a worker has claimed it (abandoned
+# claims are taken over by other workers, this is the last resort)
+POOL_TASK_TIMEOUT_FACTOR = 2
+
+
+def _get_solver_options(args: List[str]) -> Dict[str, str]:
+    """ Solver's command line arguments as a dict, e.g. `--time-limit 10`
+        becomes `{"time_limit": "10"}`
+    """
+    return {name[2:].replace("-", "_"): value for name, value in zip(args[::2], args[1::2])}
+
+
+class ExperimentExistsError(ValueError):
+    """ An experiment with the same name exists already (experiments are
+        identified by their names - in the index and on the storage)
+    """
+
+    def __init__(self, experiment_name: str) -> None:
+        super().__init__(f"An experiment named {experiment_name!r} exists already")
+        self.experiment_name = experiment_name
+
+
+def _graphs():
+    """ Charts (plotly and pandas) are imported only when they're rendered """
+    from scheduler import graphs
+    return graphs
+
 
 class Scheduler:
 
     def __init__(self, project_id: str, region: str, bucket_name: str,
                  entity_name: str, artifacts_repository_name: str,
-                 batch_machine_type: str, service_account: str = None) -> None:
+                 batch_machine_type: str, service_account: str = None,
+                 results_cache: ResultsCache = None,
+                 figures_cache: ResultsCache = None,
+                 experiments_page_size: int = 20,
+                 batch_max_running_jobs: int | None = None,
+                 batch_max_vcpus: int | None = None,
+                 batch_auto_sizing: bool = False,
+                 batch_task_max_duration: int = 3600,
+                 batch_array_jobs: bool = False,
+                 batch_portfolio_size: int = 1,
+                 batch_spot_vms: bool = False,
+                 batch_pool_size: int = 0,
+                 batch_pool_max_variables: int = 20000,
+                 batch_pool_idle_timeout: int = 600) -> None:
 
         # Data
         self.project_id = project_id
@@ -30,17 +108,46 @@ class Scheduler:
         self.bucket_name = bucket_name
         self.artifacts_repository_name = artifacts_repository_name
         self.batch_machine_type = batch_machine_type
+        self.batch_task_max_duration = batch_task_max_duration
+        self.batch_array_jobs = batch_array_jobs
+        self.batch_portfolio_size = batch_portfolio_size
+        self.batch_spot_vms = batch_spot_vms
+        self.batch_pool_size = batch_pool_size
+        self.batch_pool_max_variables = batch_pool_max_variables
+        self.batch_pool_idle_timeout = batch_pool_idle_timeout
+        self.experiments_page_size = experiments_page_size
 
         # State
+        # Note: Experiments are sorted from the oldest to the newest one
         self._experiments = []
+        self._experiments_cursor = None
+        self._has_more_experiments = True
+        self._solver_image_uri: str | None = None
+        self._solver_image_lock = Lock()
+        self.results_cache = results_cache or get_shared_results_cache(256 * 1024 ** 2)
+        self.figures_cache = figures_cache or \
+            get_shared_results_cache(64 * 1024 ** 2, name="figures")
 
         # Services
         self.batch = BatchClient(project_id, region, service_account)
         self.storage = CloudStorageClient()
-        self.datastore = DatastoreClient(entity_name)
+        self.index = ExperimentIndex(entity_name)
         self.artifacts_registry = ArtifactsRegistryClient(project_id, region,
                                                           artifacts_repository_name)
         self.build = CloudBuildClient(project_id)
+        self.status_markers = StatusMarkerListener(self.storage, self.experiments_root_path)
+        self.reuse_index = ResultReuseIndex(entity_name, self.storage)
+        self.warm_start = WarmStartLibrary(entity_name, self.storage)
+        self.admission = AdmissionQueue(batch_max_running_jobs, batch_max_vcpus)
+        self.sizer = MachineSizer(entity_name, batch_task_max_duration) \
+            if batch_auto_sizing else None
+        self.pool = SolverPool(self.storage, self.batch, f"{self.root_path}/{POOL_QUEUE_DIR}",
+                               self._start_pool_workers, on_stopped=self.admission.release) \
+            if batch_pool_size > 0 else None
+
+        # Load the most recent experiments and all the ones that are still running
+        self.load_more_experiments()
+        self._load_unfinished_experiments()
 
         # Threads
         self.update_job_status_thread = Thread(
@@ -55,36 +162,362 @@ class Scheduler:
         return self._experiments
 
     @property
-    def container_uri(self) -> str:
+    def has_more_experiments(self) -> bool:
+        return self._has_more_experiments
+
+    @property
+    def root_path(self) -> str:
+        return f"{self.bucket_name}/f33-solution-factory-scheduler"
+
+    @property
+    def experiments_root_path(self) -> str:
+        return f"{self.root_path}/experiments"
+
+    def _track_unfinished_scenarios(self, experiment: Experiment) -> None:
+        arrays = {}
+        for scenario in experiment.scenarios:
+            if scenario.status >= JobStatus.State.SUCCEEDED:
+                continue
+            self.status_markers.watch(scenario.remote_data_path)
+            # Note: If the pool has been turned off since, the scenario gets
+            #       its own Batch job.
+            if scenario.pooled and self.pool is None and not scenario.submitted:
+                scenario.pooled = False
+            if scenario.pooled:
+                if not scenario.submitted:
+                    self._submit_to_pool(experiment, scenario)
+            elif scenario.batch_array_job is not None:
+                arrays.setdefault(scenario.batch_array_job, []).append(scenario)
+            elif scenario.submitted:
+                self.admission.mark_as_running(scenario.batch_job_name,
+                                               self.get_job_vcpus(scenario))
+            else:
+                self._enqueue(experiment, scenario)
+
+        for array_job_name, scenarios in arrays.items():
+            if all(scenario.submitted for scenario in scenarios):
+                self.admission.mark_as_running(
+                    array_job_name,
+                    self._get_array_parallelism(scenarios) * self.get_job_vcpus(scenarios[0]))
+            else:
+                self._enqueue_array(experiment, array_job_name, scenarios)
+
+    def _add_older_experiments(self, experiments: List[Experiment]) -> None:
+        known = {experiment.experiment_name for experiment in self._experiments}
+        older = [experiment for experiment in experiments
+                 if experiment.experiment_name not in known]
+        for experiment in older:
+            self._track_unfinished_scenarios(experiment)
+        self._experiments = sorted(older + self._experiments,
+                                   key=lambda experiment: experiment.created_at)
+
+    def load_more_experiments(self) -> None:
+        """ Loads the next page of (older) experiments from Datastore """
+        if not self._has_more_experiments:
+            return
+
+        experiments, self._experiments_cursor = self.index.load_experiments(
+            self._experiments_cursor, self.experiments_page_size)
+        self._has_more_experiments = self._experiments_cursor is not None
+        self._add_older_experiments(experiments)
+
+    def _load_unfinished_experiments(self) -> None:
+        known = {experiment.experiment_name for experiment in self._experiments}
+        names = self.index.list_unfinished_experiment_names() - known
+        if len(names):
+            self._add_older_experiments(self.index.load_experiments_by_name(names))
+
+    @property
+    def container_repository(self) -> str:
         return (f"{self.region}-docker.pkg.dev/{self.project_id}/"
-                f"{self.artifacts_repository_name}/scheduler:latest")
+                f"{self.artifacts_repository_name}/scheduler")
 
-    def run(self, job_name: str, cloud_data_dir: str, args: Dict[str, str]):
-        num_vcpus, memory_size = self.batch._get_machine_parameters(self.batch_machine_type)
+    @property
+    def container_uri(self) -> str:
+        """ Solver's image tagged with the version of the solver's code """
+        return f"{self.container_repository}:{self.solver_version}"
+
+    @property
+    def solver_image_uri(self) -> str:
+        """ Image used by Batch jobs. It's pinned by its digest once known, so
+            every VM pulls exactly the same image.
+        """
+        if self._solver_image_uri is None:
+            self.check_if_scheduler_image_exists()
+        return self._solver_image_uri or self.container_uri
+
+    @cached_property
+    def solver_version(self) -> str:
+        """ Hash of the solver's code. Results are reused only if they were
+            produced by the same version of the solver.
+
+            Note: Only names and contents of the archived files are hashed
+                  (timestamps inside the archive don't matter).
+        """
+        digest = hashlib.sha256()
+        with zipfile.ZipFile(SCHEDULER_ZIP_LOCAL) as archive:
+            for name in sorted(archive.namelist()):
+                digest.update(name.encode() + b"\0" + archive.read(name) + b"\0")
+        return digest.hexdigest()[:16]
+
+    def run(self, job_name: str, cloud_data_dir: str, args: Dict[str, str],
+            machine_type: str | None = None, task_count: int | None = None,
+            parallelism: int | None = None):
+        machine_type = machine_type or self.batch_machine_type
+        num_vcpus, memory_size = self.batch._get_machine_parameters(machine_type)
         self.batch.run_container(
             custom_job_name=job_name,
-            container_uri=self.container_uri,
+            container_uri=self.solver_image_uri,
             container_args=args,
             bucket_path_to_mount=cloud_data_dir,
             compute_vcpu_per_task=num_vcpus,
             compute_memory_per_task=memory_size,
-            machine_type=self.batch_machine_type
+            task_max_duration=f"{self.batch_task_max_duration}s",
+            task_max_retry=SPOT_TASK_MAX_RETRY if self.batch_spot_vms else TASK_MAX_RETRY,
+            machine_type=machine_type,
+            task_count=task_count,
+            spot=self.batch_spot_vms,
+            parallelism=parallelism
         )
 
-    def run_experiment(self, experiment_name: str, jobs: bytes, scenarios: bytes):
+    def _start_pool_workers(self, job_name: str) -> None:
+        """ Starts `batch_pool_size` solver's workers (tasks of a single job)
+            that take scenarios from the pool's queue
+
+            Note: The pool's job doesn't wait in the admission queue (pooled
+                  scenarios would wait for a VM again), but its vCPUs count
+                  towards the limits until it finishes, so other jobs wait
+                  for it instead.
+        """
+        num_vcpus, memory_size = self.batch._get_machine_parameters(self.batch_machine_type)
+        self.admission.mark_as_running(job_name, self.batch_pool_size * num_vcpus)
+        try:
+            self._run_pool_job(job_name, num_vcpus, memory_size)
+        except Exception:
+            self.admission.release(job_name)
+            raise
+
+    def _run_pool_job(self, job_name: str, num_vcpus: int, memory_size: int) -> None:
+        self.batch.run_container(
+            custom_job_name=job_name,
+            container_uri=self.solver_image_uri,
+            container_entrypoint="python",
+            container_args=["worker.py", "--queue-dir", POOL_QUEUE_DIR,
+                            "--idle-timeout", str(self.batch_pool_idle_timeout),
+                            "--max-lifetime", str(POOL_MAX_LIFETIME)],
+            bucket_path_to_mount=self.root_path,
+            compute_vcpu_per_task=num_vcpus,
+            compute_memory_per_task=memory_size,
+            # Note: A worker can start its last scenario right before the end of its lifetime
+            task_max_duration=f"{POOL_MAX_LIFETIME + self.batch_task_max_duration}s",
+            task_max_retry=SPOT_TASK_MAX_RETRY if self.batch_spot_vms else TASK_MAX_RETRY,
+            machine_type=self.batch_machine_type,
+            task_count=self.batch_pool_size,
+            spot=self.batch_spot_vms
+        )
+
+    def get_machine_type(self, scenario: Scenario) -> str:
+        return scenario.sizing.get("machine_type", self.batch_machine_type)
+
+    def get_job_vcpus(self, scenario: Scenario) -> int:
+        num_vcpus, _ = self.batch._get_machine_parameters(self.get_machine_type(scenario))
+        return num_vcpus * scenario.portfolio_size
+
+    def get_queue_position(self, scenario: Scenario) -> int | None:
+        """ Position of the scenario in the local queue (None if it has been
+            submitted to Batch already)
+        """
+        return self.admission.position(self._get_queued_job_name(scenario))
+
+    def _get_queued_job_name(self, scenario: Scenario) -> str:
+        """ Name of the Batch job that runs the scenario (it's shared by all
+            scenarios of an array job)
+        """
+        return scenario.batch_array_job or scenario.batch_job_name
+
+    def _get_array_parallelism(self, scenarios: List[Scenario]) -> int:
+        """ Number of tasks of an array job that run at once, so the job fits
+            into `batch_max_vcpus` (all its tasks use the same machine type)
+        """
+        max_vcpus = self.admission.max_vcpus
+        if max_vcpus is None or len(scenarios) == 0:
+            return max(1, len(scenarios))
+        return max(1, min(len(scenarios), max_vcpus // self.get_job_vcpus(scenarios[0])))
+
+    def _get_array_scenarios(self, experiment: Experiment, array_job_name: str) -> List[Scenario]:
+        return [scenario for scenario in experiment.scenarios
+                if scenario.batch_array_job == array_job_name]
+
+    def _enqueue(self, experiment: Experiment, scenario: Scenario) -> None:
+
+        def _submit():
+            # Note: The scenario could have been cancelled while it was waiting
+            if scenario.status >= JobStatus.State.SUCCEEDED:
+                return
+            # Note: A previous attempt could have created the job even though
+            #       it has failed on our side (e.g. a deadline or a Datastore error).
+            try:
+                self.run(job_name=scenario.batch_job_name,
+                         cloud_data_dir=scenario.remote_data_path,
+                         args=scenario.solver_args, machine_type=self.get_machine_type(scenario),
+                         task_count=scenario.portfolio_size if scenario.portfolio_size > 1
+                         else None)
+            except AlreadyExists:
+                logging.info(f"{scenario.batch_job_name} has been submitted already.")
+            scenario.submitted = True
+            if scenario.status >= JobStatus.State.SUCCEEDED:
+                self.batch.delete_jobs([scenario.batch_job_name])
+                return
+            telemetry.record_event(scenario, "submitted")
+            self.index.save_scenarios(experiment, [scenario])
+
+        def _on_error(error: Exception):
+            logging.error(f"Scenario {scenario.scenario_name} couldn't be submitted: {error}")
+            scenario.status = JobStatus.State.FAILED
+            self.index.save_scenarios(experiment, [scenario])
+
+        self.admission.push(scenario.batch_job_name, _submit,
+                            vcpus=self.get_job_vcpus(scenario),
+                            priority=scenario.priority,
+                            estimated_cost=scenario.estimated_cost,
+                            on_error=_on_error)
+
+    def _submit_to_pool(self, experiment: Experiment, scenario: Scenario) -> None:
+        """ Hands a (small) scenario over to workers of the pool. It doesn't go
+            through the admission queue - the pool's size is fixed.
+        """
+        try:
+            self.pool.submit(scenario, {
+                "data_dir": scenario.remote_data_path[len(self.root_path) + 1:],
+                "options": _get_solver_options(scenario.solver_args),
+            })
+        except Exception as error:
+            logging.error(f"Scenario {scenario.scenario_name} couldn't be submitted: {error}")
+            scenario.status = JobStatus.State.FAILED
+            self.index.save_scenarios(experiment, [scenario])
+            return
+        scenario.submitted = True
+        telemetry.record_event(scenario, "submitted")
+        self.index.save_scenarios(experiment, [scenario])
+
+    def _enqueue_array(self, experiment: Experiment, array_job_name: str,
+                       scenarios: List[Scenario]) -> None:
+        """ Queues scenarios that run as tasks of a single (array) Batch job """
+        experiment_path = f"{self.experiments_root_path}/{experiment.experiment_name}"
+
+        # Note: Tasks are assigned at the first attempt and kept for the next
+        #       ones - the job might exist already (see `AlreadyExists` below)
+        #       and its tasks have to find the same scenarios in the manifest.
+        assigned: List[Scenario] = []
+
+        def _submit():
+            # Note: Task indices are assigned at the submission, so scenarios
+            #       cancelled in the meantime are not part of the job at all.
+            if len(assigned) == 0:
+                assigned.extend(scenario for scenario in scenarios
+                                if scenario.status < JobStatus.State.SUCCEEDED)
+            to_run = assigned
+            if len(to_run) == 0:
+                return
+
+            manifest = {"tasks": []}
+            for task_index, scenario in enumerate(to_run):
+                scenario.batch_task_index = task_index
+                manifest["tasks"].append({
+                    "data_dir": scenario.remote_data_path[len(experiment_path) + 1:],
+                    "options": _get_solver_options(scenario.solver_args),
+                })
+            self.storage.upload_content(f"{experiment_path}/{ARRAY_JOB_MANIFEST}",
+                                        json.dumps(manifest), overwrite=True)
+
+            try:
+                self.run(job_name=array_job_name, cloud_data_dir=experiment_path,
+                         args=["--manifest", ARRAY_JOB_MANIFEST],
+                         machine_type=self.get_machine_type(to_run[0]), task_count=len(to_run),
+                         parallelism=self._get_array_parallelism(to_run))
+            except AlreadyExists:
+                logging.info(f"{array_job_name} has been submitted already.")
+            for scenario in to_run:
+                scenario.submitted = True
+                telemetry.record_event(scenario, "submitted")
+            if all(scenario.status >= JobStatus.State.SUCCEEDED for scenario in to_run):
+                self.batch.delete_jobs([array_job_name])
+            self.index.save_scenarios(experiment, to_run)
+
+        def _on_error(error: Exception):
+            logging.error(f"Array job {array_job_name} couldn't be submitted: {error}")
+            # Note: Cancelled (and finished) scenarios keep their status
+            failed = [scenario for scenario in scenarios
+                      if scenario.status < JobStatus.State.SUCCEEDED]
+            for scenario in failed:
+                scenario.status = JobStatus.State.FAILED
+            self.index.save_scenarios(experiment, failed)
+
+        # Note: Tasks run at most `parallelism` at a time, so the job never
+        #       uses more vCPUs than the limit (even if it's admitted alone).
+        self.admission.push(array_job_name, _submit,
+                            vcpus=self._get_array_parallelism(scenarios)
+                            * self.get_job_vcpus(scenarios[0]),
+                            priority=scenarios[0].priority,
+                            estimated_cost=max(scenario.estimated_cost for scenario in scenarios),
+                            on_error=_on_error)
+
+    def has_experiment(self, experiment_name: str) -> bool:
+        """ Checks if the name is taken (also by experiments that haven't been loaded) """
+        return any(experiment.experiment_name == experiment_name
+                   for experiment in self._experiments) \
+            or self.index.has_experiment(experiment_name)
+
+    def run_experiment(self, experiment_name: str, jobs: bytes, scenarios: bytes,
+                       priority: int = 0, instance: Instance | None = None):
+        """ Creates an experiment and runs its scenarios
+
+        Args:
+            experiment_name (str): Name of the experiment
+            jobs (bytes): Content of `jobs.json`
+            scenarios (bytes): Content of `scenarios.csv`
+            priority (int): Priority of the experiment's scenarios
+            instance (Instance): Description of the jobs if they've been already
+                validated with `parse_jobs` (`jobs` has to be canonical then)
+
+        Raises:
+            ExperimentExistsError: The name is taken by another experiment
+        """
 
         def _get_random_id(): return str(uuid4())[:8]
         def _generate_bucket_path(experiment_name, scenario_name):
-            return (
-                f"{self.bucket_name}/f33-solution-factory-scheduler/"
-                f"experiments/{experiment_name}/{scenario_name}"
-            )
+            return f"{self.experiments_root_path}/{experiment_name}/{scenario_name}"
+        def _remove_nonascii(text: str):
+            text = text.lower()
+            valid_characters = set(string.ascii_lowercase + string.digits)
+            return "".join([letter for letter in text if letter in valid_characters])
+
+        # Note: A second experiment of the same name would be merged with the
+        #       first one (and deleting either of them would delete both).
+        if self.has_experiment(experiment_name):
+            raise ExperimentExistsError(experiment_name)
 
         # Iterate over scenarios
+        # Note: pandas is heavy to import and it's needed only here
+        import pandas as pd
         file_like_data = StringIO(str(scenarios, "utf-8"))
         scenarios_df = pd.read_csv(file_like_data)
 
-        experiment = Experiment(experiment_name=experiment_name)
+        if instance is None:
+            jobs, instance = parse_jobs(BytesIO(jobs))
+        experiment = Experiment(experiment_name=experiment_name,
+                                instance_hash=instance.content_hash)
+
+        # Find the best known solution of the same (or a similar) instance
+        hint = self.warm_start.get_hint(instance.content_hash, instance.job_hashes)
+        self.warm_start.add_instance(instance.content_hash, instance.job_hashes)
+
+        # Pick a machine (and the number of solver's workers) that fits the instance
+        sizing = asdict(self.sizer.choose(instance)) if self.sizer is not None else {}
+
+        # Small instances are solved by the pool's workers (no VM has to be started for them)
+        is_small = self.pool is not None and InstanceFeatures.from_instance(instance) \
+            .estimated_variables <= self.batch_pool_max_variables
 
         for _, row in scenarios_df.iterrows():
             scenario_parameters = row.to_dict()
@@ -96,96 +529,528 @@ class Scheduler:
             self.storage.upload_content(f"{storage_path}/params.json",
                                         json.dumps(scenario_parameters))
 
-            # Run the solver
-            def _remove_nonascii(text: str):
-                text = text.lower()
-                valid_characters = set(string.ascii_lowercase + string.digits)
-                return "".join([letter for letter in text if letter in valid_characters])
-
             job_name = [experiment_name, scenario_name, _get_random_id()]
             job_name = "-".join([_remove_nonascii(part) for part in job_name])
-            args = ["--jobs", "jobs.json", "--parameters", "params.json"]
-            self.run(job_name=job_name, cloud_data_dir=storage_path, args=args)
 
             scenario = Scenario(
                 scenario_name=scenario_name,
                 batch_job_name=job_name,
                 params=scenario_parameters,
-                remote_data_path=storage_path
+                remote_data_path=storage_path,
+                reuse_key=self.reuse_index.get_key(instance.content_hash, scenario_parameters,
+                                                   self.solver_version),
+                priority=priority,
+                # Note: The number of alternative routes drives the size of the model
+                estimated_cost=sizing.get("estimated_runtime", instance.num_alternatives),
+                sizing=sizing
             )
+            telemetry.record_event(scenario, "created")
             experiment.scenarios.append(scenario)
 
-        # Add entry to a local tracker
+            # Reuse results of an identical scenario that has been solved before
+            scenario.reused_from = self.reuse_index.link(scenario.reuse_key, storage_path)
+            if scenario.reused_from is not None:
+                scenario.status = JobStatus.State.SUCCEEDED
+                scenario.metrics = self.storage.download_content(
+                    f"{storage_path}/metrics.json", json.loads)
+                continue
+
+            # Run the solver (as soon as there is enough capacity available)
+            args = ["--jobs", "jobs.json", "--parameters", "params.json"]
+            if hint is not None:
+                self.storage.upload_content(f"{storage_path}/hint.json", json.dumps(hint))
+                args += ["--hint", "hint.json"]
+            args += ["--time-limit", str(int(0.9 * self.batch_task_max_duration))]
+            if len(sizing):
+                args += ["--num-workers", str(sizing["num_workers"])]
+
+            # Scale a hard scenario out: it's solved by many machines at once
+            # Note: Without sizing, every scenario is considered hard.
+            if self.batch_portfolio_size > 1 and sizing.get("estimated_runtime", float("inf")) \
+                    > TIME_BUDGET_FRACTION * self.batch_task_max_duration:
+                scenario.portfolio_size = self.batch_portfolio_size
+                args += ["--portfolio-size", str(scenario.portfolio_size)]
+            scenario.solver_args = args
+            scenario.submitted = False
+            scenario.pooled = is_small and scenario.portfolio_size == 1
+
+        # Note: All scenarios of an experiment share the machine type, so they
+        #       can run as tasks of a single (array) job - one create request
+        #       and one status request per experiment.
+        to_run = [scenario for scenario in experiment.scenarios
+                  if not scenario.submitted and scenario.portfolio_size == 1
+                  and not scenario.pooled]
+        if self.batch_array_jobs and len(to_run) > 1:
+            array_job_name = "-".join([_remove_nonascii(experiment_name), _get_random_id()])
+            for scenario in to_run:
+                scenario.batch_array_job = array_job_name
+
+        experiment.status = min([scenario.status for scenario in experiment.scenarios],
+                                default=experiment.status)
+
+        # Add entry to a local tracker and persist it
+        self.index.save_experiment(experiment)
+        self._track_unfinished_scenarios(experiment)
         self._experiments.append(experiment)
+        self.admission.dispatch()
 
     def get_logs_url(self, scenario: Scenario):
+        # Note: Logs of a scenario of the pool are among logs of the pool's
+        #       current job (a restarted app knows only the jobs it has started).
+        job_name = self._get_queued_job_name(scenario)
+        if scenario.pooled and self.pool is not None and self.pool.job_name is not None:
+            job_name = self.pool.job_name
         return (
             "https://console.cloud.google.com/batch/"
             f"jobsDetail/regions/{self.region}/"
-            f"jobs/{scenario.batch_job_name}/logs?project={self.project_id}"
+            f"jobs/{job_name}/logs?project={self.project_id}"
         )
 
-    def check_if_scheduler_image_exists(self):
-        return self.artifacts_registry.check_if_container_exists(
-            self.container_uri)
+    def check_if_scheduler_image_exists(self) -> bool:
+        """ Checks if the image of the current solver's version has been built
+            and remembers its digest.
 
-    def build_scheduler_container(self):
-        self.storage.upload_file(SCHEDULER_ZIP_LOCAL,
-                                 f"{self.bucket_name}/{SCHEDULER_ZIP_REMOTE}",
-                                 overwrite=True)
-        self.build.build_container_from_archive(self.bucket_name,
-                                                SCHEDULER_ZIP_REMOTE,
-                                                self.container_uri)
+            Note: Images are never deleted by the app and the version changes
+                  only with a new deploy, so only a positive answer is
+                  remembered (the registry is asked until the image exists).
+        """
+        if self._solver_image_uri is None:
+            digest = self.artifacts_registry.get_container_digest(self.container_uri)
+            if digest is not None:
+                self._solver_image_uri = f"{self.container_repository}@{digest}"
+        return self._solver_image_uri is not None
+
+    def build_scheduler_container(self) -> None:
+        """ Builds and pushes the image of the current solver's version
+            (unless another session has just done it)
+        """
+        with self._solver_image_lock:
+            if self.check_if_scheduler_image_exists():
+                return
+
+            zip_remote = SCHEDULER_ZIP_REMOTE.format(version=self.solver_version)
+            self.storage.upload_file(SCHEDULER_ZIP_LOCAL, f"{self.bucket_name}/{zip_remote}",
+                                     overwrite=True)
+            # Note: The previous build (`:latest`) is only a source of cached
+            #       layers, Batch jobs never use it.
+            digest = self.build.build_container_from_archive(
+                self.bucket_name, zip_remote, self.container_uri,
+                cache_from=f"{self.container_repository}:latest")
+            self._solver_image_uri = f"{self.container_repository}@{digest}"
 
     def get_artifacts_url(self, scenario: Scenario):
         path = scenario.remote_data_path
         return f"https://console.cloud.google.com/storage/browser/{path}"
 
-    def render_gantt_chart(self, scenario: Scenario):
-        return graphs.render_gantt_chart(scenario)
+    def get_results(self, scenario: Scenario) -> List[Dict]:
+        """ Fetches scenario's results on demand (through the shared cache) """
+        results_remote_path = scenario.remote_data_path + "/results.json"
+        content = self.results_cache.get(
+            results_remote_path, lambda: self.storage.download_content(results_remote_path))
+        return json.loads(content)
+
+    def get_summary(self, scenario: Scenario) -> Dict | None:
+        """ Fetches scenario's aggregates (`summary.json`, its size depends only
+            on the number of machines) produced by the solver. Returns None for
+            scenarios solved by an older solver.
+        """
+        summary_remote_path = scenario.remote_data_path + "/summary.json"
+
+        def _download() -> bytes:
+            try:
+                return self.storage.download_content(summary_remote_path)
+            except NotFound:
+                return b"null"
+
+        return json.loads(self.results_cache.get(summary_remote_path, _download))
+
+    def render_overview_chart(self, scenario: Scenario) -> Dict | None:
+        summary = self.get_summary(scenario)
+        if summary is None:
+            return None
+        return self._get_figure(f"overview:{scenario.batch_job_name}",
+                                lambda: _graphs().render_overview_chart(summary).to_json().encode())
+
+    def get_gantt_dimensions(self, scenario: Scenario) -> Dict:
+        return _graphs().get_gantt_dimensions(self.get_results(scenario))
+
+    def _get_figure(self, key: str, build: Callable[[], bytes]) -> Dict:
+        """ Returns a figure (as a dict) from the figures cache. On a miss,
+            `build` is called and has to return the figure serialized to JSON.
+        """
+        return json.loads(self.figures_cache.get(key, build))
+
+    def _build_full_gantt_chart(self, scenario: Scenario) -> bytes:
+        """ The unfiltered chart is persisted next to `results.json`, so it's
+            built only once (across sessions and restarts of the app)
+        """
+        figure_remote_path = f"{scenario.remote_data_path}/{GANTT_FIGURE_NAME}"
+        try:
+            return self.storage.download_content(figure_remote_path)
+        except NotFound:
+            pass
+
+        content = _graphs().render_gantt_chart(self.get_results(scenario)).to_json().encode()
+        try:
+            self.storage.upload_from_bytes(figure_remote_path, content, overwrite=True)
+        except Exception as error:
+            logging.warning(f"Cannot persist {figure_remote_path}: {error}")
+        return content
+
+    def render_gantt_chart(self, scenario: Scenario, machines: List[str] | None = None,
+                           jobs: List[str] | None = None, time_window: tuple | None = None
+                           ) -> Dict:
+        # Note: Results of a job (unique name) don't change once it has finished
+        if not machines and not jobs and time_window is None:
+            return self._get_figure(f"gantt:{scenario.batch_job_name}",
+                                    lambda: self._build_full_gantt_chart(scenario))
+
+        filters = json.dumps([sorted(machines or []), sorted(jobs or []),
+                              [str(value) for value in time_window or []]])
+        key = f"gantt:{scenario.batch_job_name}:{hashlib.sha1(filters.encode()).hexdigest()}"
+        return self._get_figure(key, lambda: _graphs().render_gantt_chart(
+            self.get_results(scenario), machines=machines, jobs=jobs,
+            time_window=time_window).to_json().encode())
+
+    def render_radar_plot(self, experiment: Experiment) -> Dict | None:
+        if len(experiment.scenarios) == 0:
+            return None
+
+        # Note: The chart changes whenever metrics of any scenario change
+        version = hashlib.sha1(json.dumps(
+            [(int(scenario.status), scenario.metrics) for scenario in experiment.scenarios],
+            sort_keys=True).encode()).hexdigest()
+        key = f"radar:{experiment.experiment_name}:{experiment.created_at.isoformat()}:{version}"
+        return self._get_figure(key, lambda: _graphs().render_radar_plot(experiment).to_json().encode())
+
+    def _get_export_path(self, experiment: Experiment, format: str) -> str:
+        created_at = experiment.created_at.strftime("%Y%m%d%H%M%S")
+        return (f"{self.bucket_name}/f33-solution-factory-scheduler/exports/"
+                f"{experiment.experiment_name}-{created_at}.{format}")
+
+    def export_experiment(self, experiment: Experiment, format: str = "zip") -> str:
+        """ Exports parameters, metrics and results of all experiment's scenarios
+            into a single file on the storage
+
+        Args:
+            experiment (Experiment): Experiment to export
+            format (str): One of `EXPORT_FORMATS` ("zip" or "parquet")
+
+        Returns:
+            str: URL to download the file
+        """
+        # Note: The file is streamed to the storage as it's being built (with
+        #       a resumable upload), so it's never held in the app's memory.
+        export_path = self._get_export_path(experiment, format)
+        with self.storage.open_for_writing(export_path) as output:
+            EXPORT_FORMATS[format](self.storage, experiment, output)
+        return f"https://storage.cloud.google.com/{export_path}"
+
+    def get_timings_summary(self, experiment: Experiment) -> List[Dict]:
+        return telemetry.summarize(experiment)
+
+    def render_timings_breakdown(self, experiment: Experiment):
+        breakdowns = {scenario.scenario_name: telemetry.get_breakdown(scenario)
+                      for scenario in experiment.scenarios if scenario.reused_from is None}
+        return _graphs().render_timings_breakdown(breakdowns)
 
-    def render_radar_plot(self, experiment: Experiment):
-        return graphs.render_radar_plot(experiment)
+    def _cancel_scenarios(self, experiment: Experiment,
+                          scenarios: List[Scenario]) -> List[Scenario]:
+        """ Stops unfinished scenarios: queued ones are removed from the local
+            queue and Batch jobs of the submitted ones are deleted (at once).
 
-    def delete_experiment(self, to_delete: Experiment):
+        Returns:
+            List[Scenario]: Scenarios that have been cancelled
+        """
+        cancelled, to_delete = [], set()
+        for scenario in scenarios:
+            if scenario.status >= JobStatus.State.SUCCEEDED:
+                continue
+
+            # Note: The status goes first, so neither the poller nor the admission
+            #       queue touch the scenario anymore.
+            scenario.status = JobStatus.State.DELETION_IN_PROGRESS
+            telemetry.record_event(scenario, "cancelled")
+            self.status_markers.unwatch(scenario.remote_data_path)
+            cancelled.append(scenario)
+
+            # Note: A scenario that's being solved by the pool runs on (its
+            #       worker can't be interrupted), but its results are ignored.
+            if scenario.pooled:
+                if self.pool is not None:
+                    self.pool.remove(scenario)
+                continue
+
+            # Note: A single task of an array job can't be stopped, so the job
+            #       is deleted once none of its scenarios is needed anymore.
+            job_name = self._get_queued_job_name(scenario)
+            if scenario.batch_array_job is not None and any(
+                    other.status < JobStatus.State.SUCCEEDED
+                    for other in self._get_array_scenarios(experiment, job_name)):
+                continue
+            self.admission.remove(job_name)
+            if scenario.submitted:
+                to_delete.add(job_name)
+
+        self.batch.delete_jobs(sorted(to_delete))
+        return cancelled
+
+    def cancel_scenario(self, experiment: Experiment, scenario: Scenario) -> None:
+        """ Terminates an unfinished scenario (the rest of the experiment runs on) """
+        cancelled = self._cancel_scenarios(experiment, [scenario])
+        if len(cancelled):
+            self.index.save_scenarios(experiment, cancelled)
+
+    def delete_experiment(self, to_delete: Experiment, delete_files: bool = False):
+        """ Removes an experiment and terminates its unfinished scenarios
+
+        Args:
+            to_delete (Experiment): Experiment to delete
+            delete_files (bool): Deletes experiment's files on the storage too
+                (results of its scenarios can't be reused after that)
+        """
         self._experiments.remove(to_delete)
+        self._cancel_scenarios(to_delete, to_delete.scenarios)
+        self.index.delete_experiment(to_delete)
+        for scenario in to_delete.scenarios:
+            self.admission.remove(self._get_queued_job_name(scenario))
+            self.status_markers.unwatch(scenario.remote_data_path)
+            self.results_cache.invalidate(scenario.remote_data_path + "/results.json")
+            self.results_cache.invalidate(scenario.remote_data_path + "/summary.json")
+            self.figures_cache.invalidate(f"gantt:{scenario.batch_job_name}")
+            self.figures_cache.invalidate(f"overview:{scenario.batch_job_name}")
+        for format in EXPORT_FORMATS:
+            try:
+                self.storage.delete_file(self._get_export_path(to_delete, format))
+            except NotFound:
+                pass
+
+        # Note: Pointers to the deleted results (reuse index, warm starts) are
+        #       dropped lazily - when they're used for the first time.
+        if delete_files:
+            num_deleted = self.storage.delete_directory(
+                f"{self.experiments_root_path}/{to_delete.experiment_name}")
+            logging.info(f"Deleted {num_deleted} files of {to_delete.experiment_name}.")
 
     def get_random_name(self):
         return get_random_name()
 
-    def update_jobs_state(self, loop: bool = False, sleep_in_secs: int = 10):
-        while(True):
-            for experiment in self._experiments:
-                experiment_new_status = []
+    def _get_batch_status(self, scenario: Scenario,
+                          task_states: Dict[str, Dict] | None = None) -> JobStatus.State:
+        """ Status of the scenario's job or of its task (for array jobs). Tasks
+            of an array job are listed once per poll and kept in `task_states`.
+        """
+        if scenario.batch_array_job is None:
+            return self.batch.get_job_status(scenario.batch_job_name)
+
+        task_states = {} if task_states is None else task_states
+
+        if scenario.batch_array_job not in task_states:
+            task_states[scenario.batch_array_job] = self.batch.list_tasks(scenario.batch_array_job)
+        # Note: Tasks are listed by Batch a moment after the job is created
+        return task_states[scenario.batch_array_job].get(scenario.batch_task_index,
+                                                         JobStatus.State.QUEUED)
+
+    def _get_pool_status(self, scenario: Scenario, marker: Dict | None,
+                         poll_batch: bool) -> JobStatus.State | None:
+        """ Status of a scenario of the pool (None if it hasn't changed). A FAILED
+            marker is final (workers retry only scenarios whose worker has
+            stopped in the middle of the solve, and those have no marker).
+            Scenarios waiting in the queue never time out - only the ones that
+            have been claimed for too long.
+        """
+        if marker is not None:
+            return JobStatus.State.FAILED
+        if not poll_batch or self.pool is None:
+            return None
+
+        claim = self.pool.get_claim(scenario)
+        if claim is None:
+            return None
+        running_for = time.time() - claim["claimed_at"]
+        if running_for > POOL_TASK_TIMEOUT_FACTOR * self.batch_task_max_duration:
+            logging.warning(f"Scenario {scenario.scenario_name} hasn't been solved by the pool "
+                            f"in {running_for:.0f} s.")
+            self.pool.remove(scenario)
+            return JobStatus.State.FAILED
+        return JobStatus.State.RUNNING
+
+    def _release(self, experiment: Experiment, scenario: Scenario) -> None:
+        """ Frees the capacity of a finished scenario (an array job is released
+            when all its scenarios have finished)
+        """
+        job_name = self._get_queued_job_name(scenario)
+        if scenario.batch_array_job is None or all(
+                other.status >= JobStatus.State.SUCCEEDED
+                for other in self._get_array_scenarios(experiment, job_name)):
+            self.admission.release(job_name)
+
+    def _refresh_scenario_status(self, experiment: Experiment, scenario: Scenario,
+                                 marker: Dict | None, poll_batch: bool,
+                                 task_states: Dict[str, Dict] | None = None) -> bool:
+        """ Updates scenario's status using its status marker (if the solver has
+            already written it) or Batch.
+
+        Returns:
+            bool: True if the status has changed
+        """
+        # Note: Workers of a portfolio write their own markers. The scenario's
+        #       one is written here, once all of them have finished.
+        batch_status = None
+        if marker is None and poll_batch and scenario.portfolio_size > 1:
+            batch_status = self._get_batch_status(scenario, task_states)
+            if batch_status in (JobStatus.State.SUCCEEDED, JobStatus.State.FAILED):
+                marker = aggregate_portfolio(self.storage, scenario.remote_data_path,
+                                             scenario.portfolio_size)
+                batch_status = JobStatus.State.FAILED if marker is None else batch_status
 
-                for scenario in experiment.scenarios:
+        if marker is not None:
+            telemetry.record_marker(scenario, marker)
 
-                    has_changed_its_status = False
+        if marker is not None and marker["state"] == "SUCCEEDED":
+            job_status = JobStatus.State.SUCCEEDED
+            scenario.metrics = marker.get("metrics", {})
 
-                    # Refresh the status
-                    if scenario.status < 4:
-                        job_status = self.batch.get_job_status(scenario.batch_job_name)
-                        has_changed_its_status = (scenario.status != job_status)
-                        scenario.status = job_status
+            # Keep the solution if it's the best one for this instance so far
+            if marker.get("makespan") is not None and experiment.instance_hash is not None:
+                self.warm_start.record(experiment.instance_hash, marker["makespan"],
+                                       scenario.remote_data_path)
 
-                    # Download metrics if the status has changed to SUCCEEDED
-                    if scenario.status == JobStatus.State.SUCCEEDED and has_changed_its_status:
-                        metrics_remote_path = scenario.remote_data_path + "/metrics.json"
-                        results_remote_path = scenario.remote_data_path + "/results.json"
+            # Improve future sizing decisions with the actual runtime
+            # Note: Portfolios and the pool (its own machine type) are not representative
+            if self.sizer is not None and len(scenario.sizing) and scenario.portfolio_size == 1 \
+                    and not scenario.pooled:
+                started_at = datetime.fromisoformat(marker["started_at"])
+                finished_at = datetime.fromisoformat(marker["finished_at"])
+                self.sizer.record(scenario.sizing, (finished_at - started_at).total_seconds(),
+                                  finished_at)
 
-                        scenario.metrics = self.storage.download_content(
-                            metrics_remote_path, json.loads)
-                        scenario.results = self.storage.download_content(
-                            results_remote_path, json.loads
-                        )
+        elif scenario.pooled:
+            job_status = self._get_pool_status(scenario, marker, poll_batch)
+            if job_status is None:
+                return False
 
-                    # Calculate the new experiment status
-                    experiment_new_status.append(scenario.status)
+        # Note: A failed attempt can be retried by Batch, so the final status
+        #       of a job that has written a FAILED marker is taken from Batch.
+        elif marker is not None or poll_batch:
+            job_status = batch_status if batch_status is not None \
+                else self._get_batch_status(scenario, task_states)
 
-                experiment.status = min(experiment_new_status) if len(experiment_new_status) \
-                    else experiment.status
+            # Download metrics if the status has changed to SUCCEEDED
+            # Note: Results are much bigger and they're fetched on demand
+            #       (see `get_results`).
+            if job_status == JobStatus.State.SUCCEEDED:
+                metrics_remote_path = scenario.remote_data_path + "/metrics.json"
+                scenario.metrics = self.storage.download_content(
+                    metrics_remote_path, json.loads)
+        else:
+            return False
+
+        has_changed_its_status = (scenario.status != job_status)
+        scenario.status = job_status
+        telemetry.record_event(scenario, job_status.name)
+        if scenario.status >= JobStatus.State.SUCCEEDED:
+            telemetry.record_event(scenario, "detected")
+            self.status_markers.unwatch(scenario.remote_data_path)
+            self._release(experiment, scenario)
+
+        # Make the results available for identical scenarios in the future
+        # Note: Only optimal solutions are reused. A solve cut off by the time
+        #       limit (or one without any solution) could do better next time,
+        #       e.g. with a longer time limit or a better hint.
+        if scenario.status == JobStatus.State.SUCCEEDED and has_changed_its_status \
+                and scenario.reuse_key is not None and marker is not None \
+                and marker.get("solve_status") == "OPTIMAL":
+            self.reuse_index.register(scenario.reuse_key, scenario.remote_data_path)
+
+        return has_changed_its_status
+
+    def update_jobs_state(self, loop: bool = False, sleep_in_secs: int = 2,
+                          batch_poll_interval_in_secs: int = 30):
+        """ Tracks scenarios until they finish. Finished scenarios are picked up
+            from status markers (checked every `sleep_in_secs`). Batch is polled
+            less often - it reports intermediate states (e.g. RUNNING) and jobs
+            that have failed without writing a marker.
+        """
+        last_batch_poll = None
+        while(True):
+            poll_batch = last_batch_poll is None or \
+                (time.monotonic() - last_batch_poll) >= batch_poll_interval_in_secs
+
+            # Note: This thread serves all sessions, so an error (e.g. a transient
+            #       one of the storage or Datastore) never stops it - the next
+            #       cycle tries again.
+            try:
+                self._update_jobs_state_once(poll_batch)
+            except Exception:
+                logging.exception("Cannot update statuses of scenarios.")
+
+            if poll_batch:
+                last_batch_poll = time.monotonic()
 
             if not loop:
                 break
 
             time.sleep(sleep_in_secs)
+
+    def _refresh_experiment(self, experiment: Experiment, markers: Dict[str, Dict],
+                            poll_batch: bool, task_states: Dict[str, Dict]) -> None:
+        """ Updates statuses of experiment's scenarios and of the experiment """
+        changed_scenarios = []
+        for scenario in experiment.scenarios:
+            if scenario.status >= JobStatus.State.SUCCEEDED or not scenario.submitted:
+                continue
+            marker = markers.get(scenario.remote_data_path)
+            # Note: A scenario that can't be refreshed doesn't hold up the others
+            #       (its marker is read again in the next cycle).
+            try:
+                if self._refresh_scenario_status(experiment, scenario, marker, poll_batch,
+                                                 task_states):
+                    changed_scenarios.append(scenario)
+            except Exception:
+                logging.exception(f"Cannot refresh the status of {scenario.scenario_name}.")
+                if marker is not None:
+                    self.status_markers.reset(scenario.remote_data_path)
+
+        if len(changed_scenarios):
+            self.index.save_scenarios(experiment, changed_scenarios)
+
+        # Calculate the new experiment status
+        experiment_new_status = [scenario.status for scenario in experiment.scenarios]
+        new_status = min(experiment_new_status) if len(experiment_new_status) \
+            else experiment.status
+        if new_status != experiment.status:
+            experiment.status = new_status
+            self.index.save_experiment_status(experiment)
+
+    def _update_jobs_state_once(self, poll_batch: bool) -> None:
+        markers = self.status_markers.poll()
+        task_states = {}
+
+        for experiment in list(self._experiments):
+
+            # Only unfinished scenarios are queried
+            if experiment.status >= JobStatus.State.SUCCEEDED:
+                continue
+
+            try:
+                self._refresh_experiment(experiment, markers, poll_batch, task_states)
+            except Exception:
+                logging.exception(f"Cannot refresh the status of {experiment.experiment_name}.")
+
+        # Restart workers of the pool if they've stopped while there are still
+        # scenarios to solve (otherwise only release the capacity of a stopped pool)
+        if poll_batch and self.pool is not None:
+            try:
+                if any(scenario.pooled and scenario.submitted
+                       and scenario.status < JobStatus.State.SUCCEEDED
+                       for experiment in list(self._experiments)
+                       for scenario in experiment.scenarios):
+                    self.pool.ensure_running()
+                else:
+                    self.pool.refresh()
+            except Exception as error:
+                logging.error(f"Cannot check workers of the pool: {error}")
+
+        # Submit queued scenarios if some of the running ones have finished
+        self.admission.dispatch()
@@ -0,0 +1,160 @@
+import math
+import logging
+import statistics
+from dataclasses import dataclass, asdict
+from typing import Dict, List
+
+from scheduler.googlecloudplatform import DatastoreClient
+from scheduler.instances import Instance
+
+# Candidate machine types (from the cheapest to the most powerful one):
+# (machine type, vCPUs, memory in MB)
+MACHINE_TYPES = [
+    ("e2-standard-2", 2, 8192),
+    ("e2-standard-4", 4, 16384),
+    ("e2-standard-8", 8, 32768),
+    ("e2-standard-16", 16, 65536),
+    ("e2-highmem-16", 16, 131072),
+    ("n2-highmem-32", 32, 262144),
+]
+
+# Rough CP-SAT footprint: a base + some memory per model variable per worker
+BASE_MEMORY_MB = 512
+MEMORY_PER_VARIABLE_MB = 0.002
+
+# Runtime (in seconds) of a single worker per model variable. It's used only
+# until there is some runtime history available.
+DEFAULT_SECONDS_PER_VARIABLE = 0.01
+
+# CP-SAT workers don't scale linearly (they run different strategies in parallel)
+PARALLEL_EFFICIENCY = 0.5
+
+# Number of past runs (of the most similar size) used for a prediction
+NUM_NEIGHBOURS = 10
+
+# Part of the time limit that a predicted runtime has to fit into
+TIME_BUDGET_FRACTION = 0.8
+
+
+@dataclass
+class InstanceFeatures:
+    num_tasks: int
+    num_alternatives: int
+    num_machines: int
+    estimated_variables: int
+    machine_load: float
+
+    @classmethod
+    def from_instance(cls, instance: Instance) -> "InstanceFeatures":
+        # Note: Every task has a main interval (start, duration, end) and every
+        #       alternative route of a task with more than one has an optional
+        #       one (presence, start, end) - see `solve_flexible_jobshop_problem`.
+        alternatives_of_flexible_tasks = max(0, instance.num_alternatives - instance.num_tasks)
+        estimated_variables = 4 * instance.num_tasks + 8 * alternatives_of_flexible_tasks
+        return cls(
+            num_tasks=instance.num_tasks,
+            num_alternatives=instance.num_alternatives,
+            num_machines=instance.num_machines,
+            estimated_variables=estimated_variables,
+            machine_load=instance.total_min_duration / max(1, instance.num_machines),
+        )
+
+    def estimated_memory_mb(self, num_workers: int) -> float:
+        return BASE_MEMORY_MB + num_workers * self.estimated_variables * MEMORY_PER_VARIABLE_MB
+
+
+@dataclass
+class SizingDecision:
+    machine_type: str
+    num_workers: int
+    estimated_runtime: float
+    estimated_variables: int
+
+
+class MachineSizer:
+    """ Picks a machine type and the number of CP-SAT workers for a scenario.
+
+        The machine has to fit the (estimated) model in memory and the
+        predicted runtime has to fit into the task's time limit. The cheapest
+        machine that meets both requirements is chosen.
+
+        Runtimes are predicted from the history of past runs (stored in
+        Datastore, `<entity_name>-runtimes`) of a similar size.
+
+    Args:
+        entity_name (str): Prefix of the Datastore kind
+        max_runtime_in_secs (int): Time limit of a single task
+        history_size (int): Number of the most recent runs used for predictions
+    """
+
+    def __init__(self, entity_name: str, max_runtime_in_secs: int,
+                 history_size: int = 500) -> None:
+        self.max_runtime_in_secs = max_runtime_in_secs
+        self.history_size = history_size
+        self.datastore = DatastoreClient(f"{entity_name}-runtimes")
+        self._history: List[Dict] | None = None
+
+    def _speedup(self, num_workers: int) -> float:
+        return 1 + PARALLEL_EFFICIENCY * (num_workers - 1)
+
+    def _load_history(self) -> List[Dict]:
+        if self._history is None:
+            entities, _ = self.datastore.list_batch(order="-finished_at",
+                                                    batch_size=self.history_size)
+            self._history = [dict(entity) for entity in entities]
+        return self._history
+
+    def record(self, decision: Dict, runtime_in_secs: float, finished_at) -> None:
+        """ Stores runtime of a finished scenario """
+        entry = {
+            "estimated_variables": decision["estimated_variables"],
+            "num_workers": decision["num_workers"],
+            "machine_type": decision["machine_type"],
+            "runtime": runtime_in_secs,
+            "finished_at": finished_at,
+        }
+        self.datastore.batch_insert([entry], _to_exclude=("estimated_variables", "num_workers",
+                                                          "machine_type", "runtime"))
+        self._load_history().insert(0, entry)
+        del self._history[self.history_size:]
+
+    def predict_runtime(self, features: InstanceFeatures, num_workers: int) -> float:
+        """ Predicts runtime (in seconds) of a single worker per model variable
+            from the runs of the most similar size and scales it to the instance.
+        """
+        variables = max(1, features.estimated_variables)
+        history = [entry for entry in self._load_history()
+                   if entry.get("estimated_variables") and entry.get("runtime") is not None]
+
+        if len(history):
+            neighbours = sorted(history, key=lambda entry: abs(
+                math.log(entry["estimated_variables"]) - math.log(variables)))[:NUM_NEIGHBOURS]
+            seconds_per_variable = statistics.median(
+                entry["runtime"] * self._speedup(entry["num_workers"]) / entry["estimated_variables"]
+                for entry in neighbours)
+        else:
+            seconds_per_variable = DEFAULT_SECONDS_PER_VARIABLE
+
+        return seconds_per_variable * variables / self._speedup(num_workers)
+
+    def choose(self, instance: Instance) -> SizingDecision:
+        features = InstanceFeatures.from_instance(instance)
+        time_budget = TIME_BUDGET_FRACTION * self.max_runtime_in_secs
+
+        decision = None
+        for machine_type, vcpus, memory_mb in MACHINE_TYPES:
+            if features.estimated_memory_mb(vcpus) > memory_mb:
+                continue
+            runtime = self.predict_runtime(features, vcpus)
+            decision = SizingDecision(machine_type, vcpus, runtime, features.estimated_variables)
+            if runtime <= time_budget:
+                break
+
+        # Note: The instance doesn't fit anywhere (the best we can do is the largest machine)
+        if decision is None:
+            machine_type, vcpus, _ = MACHINE_TYPES[-1]
+            decision = SizingDecision(machine_type, vcpus, self.predict_runtime(features, vcpus),
+                                      features.estimated_variables)
+
+        logging.info(f"Sizing: {asdict(features)} -> {asdict(decision)}")
+        return decision
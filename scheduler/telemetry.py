@@ -0,0 +1,87 @@
+import time
+import statistics
+from datetime import datetime
+from typing import Dict, List
+
+from scheduler.datastructures import Experiment, Scenario
+
+# Stages of a scenario's lifetime (event it starts with, event it ends with):
+# * queue - waiting in the local admission queue (see `AdmissionQueue`)
+# * batch_queue - waiting for Batch to schedule the job (e.g. quotas)
+# * provisioning - VM provisioning, image pull and the container start
+# * solve - the solver itself (see also the solver's phases)
+# * fetch - from the solver's last write until the scheduler picked it up
+STAGES = [
+    ("queue", "created", "submitted"),
+    ("batch_queue", "submitted", "SCHEDULED"),
+    ("provisioning", "SCHEDULED", "solver_started"),
+    ("solve", "solver_started", "solver_finished"),
+    ("fetch", "solver_finished", "detected"),
+]
+
+# Phases reported by the solver (in the status marker)
+SOLVER_PHASES = ["read_input", "build_model", "search", "extract", "write_output"]
+
+
+def record_event(scenario: Scenario, event: str, at: float | None = None) -> None:
+    """ Stores the time (epoch seconds) an event was seen for the first time """
+    scenario.timings.setdefault(event, time.time() if at is None else at)
+
+
+def record_marker(scenario: Scenario, marker: Dict) -> None:
+    """ Stores solver's timestamps and phases from its status marker """
+    for event, key in (("solver_started", "started_at"), ("solver_finished", "finished_at")):
+        if marker.get(key) is not None:
+            record_event(scenario, event, datetime.fromisoformat(marker[key]).timestamp())
+    scenario.solver_phases = marker.get("phases") or {}
+
+
+def get_breakdown(scenario: Scenario) -> Dict[str, float]:
+    """ Durations (in seconds) of the stages of a scenario. Stages with a missing
+        event are skipped.
+
+        Note: Batch states are observed by polling, so `SCHEDULED` can be seen
+              late (or not at all if the job ran between two polls). Solver's
+              timestamps are exact.
+    """
+    timings = dict(scenario.timings)
+    if "SCHEDULED" not in timings or \
+            timings["SCHEDULED"] > timings.get("solver_started", float("inf")):
+        # Provisioning is measured from the submission in this case
+        timings.pop("SCHEDULED", None)
+
+    breakdown = {}
+    for stage, start, end in STAGES:
+        if start == "SCHEDULED" and start not in timings:
+            start = "submitted"
+        if start in timings and end in timings:
+            breakdown[stage] = max(0.0, timings[end] - timings[start])
+    return breakdown
+
+
+def _percentile(values: List[float], percent: int) -> float:
+    """ Linear interpolation between the closest ranks (as `numpy.percentile`) """
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[percent - 1]
+
+
+def summarize(experiment: Experiment) -> List[Dict]:
+    """ p50/p95 of stages and solver's phases over the experiment's scenarios
+        (scenarios with reused results are skipped)
+    """
+    samples = {name: [] for name, _, _ in STAGES}
+    samples.update({f"solver: {name}": [] for name in SOLVER_PHASES})
+
+    for scenario in experiment.scenarios:
+        if scenario.reused_from is not None:
+            continue
+        for stage, duration in get_breakdown(scenario).items():
+            samples[stage].append(duration)
+        for phase, duration in scenario.solver_phases.items():
+            samples.setdefault(f"solver: {phase}", []).append(duration)
+
+    return [{"stage": name, "count": len(values),
+             "p50 [s]": round(_percentile(values, 50), 1),
+             "p95 [s]": round(_percentile(values, 95), 1)}
+            for name, values in samples.items() if len(values)]
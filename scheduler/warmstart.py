@@ -0,0 +1,124 @@
+import json
+import logging
+from collections import defaultdict
+from typing import Dict, List
+
+from scheduler.googlecloudplatform import CloudStorageClient, DatastoreClient
+from scheduler.googlecloudplatform.datastore import MAX_IN_FILTER_VALUES
+
+SOLUTION_FILE_NAME = "solution.json"
+
+# Number of job hashes in an instance's signature (they're the indexed values)
+SIGNATURE_SIZE = MAX_IN_FILTER_VALUES
+
+
+def get_signature(job_hashes: List[str]) -> List[str]:
+    """ The smallest job hashes of an instance (a min-hash signature). Similar
+        instances share most of their jobs, so they share most of their
+        smallest hashes too.
+    """
+    return sorted(set(job_hashes))[:SIGNATURE_SIZE]
+
+
+class WarmStartLibrary:
+    """ Keeps the best known solution (the shortest makespan) of every
+        instance. New scenarios on the same or a similar instance (one that
+        shares most of its jobs) get it as a hint for the solver.
+
+        Instances are stored in Datastore (`<entity_name>-solutions`, key:
+        instance hash) together with their job hashes, a path to the best
+        solution and a signature (see `get_signature`). Only the signature is
+        indexed (so similar instances can be queried) - an entity can't have
+        more than 20,000 index entries, which big instances would exceed.
+
+    Args:
+        entity_name (str): Prefix of the Datastore kind
+        storage (CloudStorageClient): Storage client
+        min_similarity (float): Min Jaccard similarity of job sets for
+            two instances to be considered similar
+    """
+
+    def __init__(self, entity_name: str, storage: CloudStorageClient,
+                 min_similarity: float = 0.5) -> None:
+        self.storage = storage
+        self.min_similarity = min_similarity
+        self.datastore = DatastoreClient(f"{entity_name}-solutions")
+
+    def add_instance(self, instance_hash: str, job_hashes: List[str]) -> None:
+        """ Registers an instance, so its solutions can be recorded later.
+
+            Note: Warm starts are only an optimization, so errors are just logged.
+        """
+        try:
+            if self.datastore.get(instance_hash) is None:
+                self.datastore.update(instance_hash, {"job_hashes": job_hashes,
+                                                      "job_signature": get_signature(job_hashes),
+                                                      "makespan": None,
+                                                      "remote_data_path": None},
+                                      _to_exclude=("job_hashes", "makespan", "remote_data_path"))
+        except Exception as error:
+            logging.warning(f"Cannot add the instance {instance_hash} to warm starts: {error}")
+
+    def record(self, instance_hash: str, makespan: int, remote_data_path: str) -> None:
+        """ Stores the solution if it's better than the best known one """
+        entity = self.datastore.get(instance_hash)
+        if entity is None:
+            return
+        if entity["makespan"] is not None and entity["makespan"] <= makespan:
+            return
+
+        logging.info(f"A new best solution of {instance_hash}: {makespan}")
+        self.datastore.update(instance_hash, {"makespan": makespan,
+                                              "remote_data_path": remote_data_path})
+
+    def _find_best(self, instance_hash: str, job_hashes: List[str]):
+        entity = self.datastore.get(instance_hash)
+        if entity is not None and entity["remote_data_path"] is not None:
+            return entity
+
+        # Look for instances that share any of the jobs of the signature
+        candidates = self.datastore.list_all(
+            filter=["job_signature", "IN", get_signature(job_hashes)])
+
+        best, best_similarity = None, self.min_similarity
+        new_jobs = set(job_hashes)
+        for candidate in candidates:
+            if candidate["remote_data_path"] is None:
+                continue
+            known_jobs = set(candidate["job_hashes"])
+            similarity = len(new_jobs & known_jobs) / len(new_jobs | known_jobs)
+            if similarity >= best_similarity:
+                best, best_similarity = candidate, similarity
+        return best
+
+    def get_hint(self, instance_hash: str, job_hashes: List[str]) -> Dict | None:
+        """ Builds a hint (in the `solution.json` format) from the best known
+            solution of the same or a similar instance. Jobs that are not
+            part of that solution are left without a hint.
+        """
+        if len(job_hashes) == 0:
+            return None
+
+        try:
+            best = self._find_best(instance_hash, job_hashes)
+        except Exception as error:
+            logging.warning(f"Cannot look for a warm start of {instance_hash}: {error}")
+            return None
+        if best is None:
+            return None
+
+        try:
+            solution = self.storage.download_content(
+                f"{best['remote_data_path']}/{SOLUTION_FILE_NAME}", json.loads)
+        except Exception as error:
+            logging.warning(f"Cannot read the solution from {best['remote_data_path']}: {error}")
+            return None
+
+        # Map solutions of the known jobs onto the new ones (by their content)
+        known_solutions = defaultdict(list)
+        for job_hash, job_solution in zip(best["job_hashes"], solution["jobs"]):
+            known_solutions[job_hash].append(job_solution)
+
+        jobs = [known_solutions[job_hash].pop(0) if len(known_solutions[job_hash]) else None
+                for job_hash in job_hashes]
+        return {"source": best["remote_data_path"], "makespan": best["makespan"], "jobs": jobs}
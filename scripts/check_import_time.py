@@ -0,0 +1,67 @@
+""" Fails if a cold import of the app's or the solver's entry point takes
+    longer than its budget. Every entry point is imported in a fresh
+    interpreter (`python -X importtime`), the best of a few runs counts.
+
+    Usage: python scripts/check_import_time.py [--app-budget 1.5] [--solver-budget 1.5]
+"""
+import os
+import sys
+import argparse
+import subprocess
+from typing import Dict, List, Tuple
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Entry point -> (working directory, modules imported at its start)
+# Note: `app.py` itself can be run only by Streamlit, so its imports are measured.
+ENTRY_POINTS = {
+    "app": (ROOT_DIR, ["streamlit", "content", "helpers"]),
+    "solver": (os.path.join(ROOT_DIR, "solver"), ["main"]),
+}
+
+
+def measure_import_time(cwd: str, modules: List[str]) -> Tuple[float, Dict[str, float]]:
+    """ Returns the total import time (in seconds) and times of top-level imports """
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {', '.join(modules)}"],
+        cwd=cwd, capture_output=True, text=True
+    )
+    if process.returncode != 0:
+        raise RuntimeError(f"Cannot import {modules}:\n{process.stderr[-2000:]}")
+
+    top_level = {}
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # Note: Nested imports are indented
+        if not name.startswith("  "):
+            top_level[name.strip()] = int(cumulative) / 1e6
+    return sum(top_level.values()), top_level
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--app-budget", type=float, default=1.5, help="In seconds")
+    parser.add_argument("--solver-budget", type=float, default=1.5, help="In seconds")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    budgets = {"app": args.app_budget, "solver": args.solver_budget}
+    failed = False
+    for name, (cwd, modules) in ENTRY_POINTS.items():
+        total, top_level = min((measure_import_time(cwd, modules) for _ in range(args.repeat)),
+                               key=lambda result: result[0])
+        within_budget = total <= budgets[name]
+        failed = failed or not within_budget
+        print(f"{name}: {total:.3f}s (budget: {budgets[name]:.3f}s) "
+              f"{'OK' if within_budget else 'OVER BUDGET'}")
+        if not within_budget:
+            for module, seconds in sorted(top_level.items(), key=lambda item: -item[1])[:10]:
+                print(f"  {seconds:.3f}s  {module}")
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
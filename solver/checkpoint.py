@@ -0,0 +1,131 @@
+"""Checkpoints of a solve, so a retried task (e.g. after a Spot VM has been
+preempted) doesn't start from nothing.
+
+The checkpoint (a small JSON file next to the outputs) keeps the best
+solution found so far, the proven objective bound and the time spent on
+the search in all attempts. A new attempt uses the solution as a hint,
+the bound as a lower bound and gets only the remaining time. If it ends
+without a solution (or there is no time left), the checkpoint's solution
+is the result.
+"""
+
+import os
+import json
+import time
+import threading
+
+CHECKPOINT_FILE_NAME = "checkpoint.json"
+
+# How often (in seconds) the checkpoint is written
+CHECKPOINT_INTERVAL = 30
+
+# A retry with less time left than that (in seconds) doesn't search at all
+# if a previous attempt has found a solution (it's used as the result)
+MIN_SEARCH_TIME = 5.0
+
+
+class Checkpoint:
+
+    def __init__(self, path, interval=CHECKPOINT_INTERVAL):
+        self.path = path
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._started_at = time.monotonic()
+        self._last_save = None
+
+        self.state = {}
+        if os.path.exists(path):
+            try:
+                with open(path, "r") as file:
+                    self.state = json.loads(file.read())
+                print("Resuming from a checkpoint (elapsed = %.1f s, objective = %s, bound = %s)"
+                      % (self.state.get("elapsed", 0), self.state.get("objective"),
+                         self.state.get("bound")))
+            except ValueError:
+                print("The checkpoint is corrupted. Starting from scratch.")
+        self._previous_elapsed = self.state.get("elapsed", 0)
+
+    @property
+    def elapsed(self):
+        """Time spent in all attempts (in seconds)."""
+        return self._previous_elapsed + time.monotonic() - self._started_at
+
+    @property
+    def hint(self):
+        return self.state.get("jobs")
+
+    @property
+    def lower_bound(self):
+        return self.state.get("bound")
+
+    @property
+    def solution(self):
+        """The best solution found so far in the `solution.json` format (None
+        if there is none). It's optimal if its objective meets the bound.
+        """
+        if self.hint is None:
+            return None
+        objective, bound = self.state["objective"], self.lower_bound
+        return {
+            "objective": objective,
+            "makespan": self.state["makespan"],
+            "status": "OPTIMAL" if bound is not None and bound >= objective else "FEASIBLE",
+            "jobs": self.hint,
+        }
+
+    def remaining(self, time_limit):
+        """The time limit of this attempt (at least a second to extract a solution)."""
+        if time_limit is None:
+            return None
+        return max(1.0, float(time_limit) - self._previous_elapsed)
+
+    def is_exhausted(self, time_limit):
+        """A previous attempt has found a solution and (almost) used up the time limit."""
+        return self.hint is not None and time_limit is not None \
+            and float(time_limit) - self._previous_elapsed < MIN_SEARCH_TIME
+
+    def on_solution(self, objective, bound, get_solution):
+        """Captures an improving solution. It's written to the file right away
+        only if the last write is older than `interval` (otherwise with the
+        next periodic save).
+        """
+        with self._lock:
+            self.state["bound"] = bound
+            self.state.update(get_solution())
+            if self._last_save is not None and time.monotonic() - self._last_save < self.interval:
+                return
+        self.save()
+
+    def save(self):
+        with self._lock:
+            state = dict(self.state, elapsed=self.elapsed)
+            self._last_save = time.monotonic()
+        # Note: Written under another name first, so a preemption in the middle
+        #       of the write doesn't leave a broken checkpoint.
+        # Note: Both the solver's callback and the periodic save write the file
+        temporary_path = self.path + ".tmp"
+        with self._write_lock:
+            with open(temporary_path, "w") as file:
+                file.write(json.dumps(state))
+            os.replace(temporary_path, self.path)
+
+    def _save_periodically(self):
+        # Note: The elapsed time has to be saved even if no solutions are found
+        while not self._stopped.wait(self.interval):
+            try:
+                self.save()
+            except OSError as error:
+                print("Cannot save the checkpoint: %r" % error)
+
+    def start(self):
+        threading.Thread(target=self._save_periodically, daemon=True).start()
+
+    def stop(self):
+        """Stops periodic saves and writes the last captured state."""
+        self._stopped.set()
+        try:
+            self.save()
+        except OSError as error:
+            print("Cannot save the checkpoint: %r" % error)
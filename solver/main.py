@@ -1,51 +1,160 @@
 import os
 import json
+import time
 import random
 import typer
-from solver import solve_flexible_jobshop_problem
+from datetime import datetime, timezone
+from solver import build_schedule, solve_flexible_jobshop_problem, summarize_schedule
+from portfolio import PORTFOLIO_DIR, solve_with_portfolio
+from checkpoint import CHECKPOINT_FILE_NAME, Checkpoint
 
 def _random():
     return round(random.random(), 2)
 
-def main(jobs: str = None, parameters: str = None):
+def _now():
+    return datetime.now(timezone.utc).isoformat()
 
+def write_status_marker(path: str, state: str, started_at: str, **kwargs):
+    """ Writes a small `status.json` file. The scheduler watches for these
+        markers to find out that a scenario has finished (without polling Batch).
+    """
+    marker = dict(state=state, started_at=started_at, finished_at=_now(), **kwargs)
+    with open(path, "w") as output:
+        output.write(json.dumps(marker))
+
+def main(jobs: str = None, parameters: str = None, hint: str = None,
+         time_limit: float = None, num_workers: int = None, manifest: str = None,
+         portfolio_size: int = 1):
+
+    started_at = _now()
+    phases = {}
+    phase_started_at = time.perf_counter()
     DATA_DIR = os.environ.get("DATA_DIR", "")
 
+    # A task of an array job: its scenario (a sub-directory and the options
+    # above) is picked from the manifest by the task's index
+    if manifest is not None:
+        task_index = int(os.environ.get("BATCH_TASK_INDEX", 0))
+        task = json.loads(open(os.path.join(DATA_DIR, manifest), "r").read())["tasks"][task_index]
+        DATA_DIR = os.path.join(DATA_DIR, task["data_dir"])
+        options = task["options"]
+        jobs, parameters, hint = options["jobs"], options["parameters"], options.get("hint")
+        time_limit = float(options["time_limit"]) if "time_limit" in options else None
+        num_workers = int(options["num_workers"]) if "num_workers" in options else None
+
     # Print all the input parameters
     debug_log = [
         "[ Input parameters: ]",
         f"  * 'jobs' = {jobs}",
         f"  * 'parameters' = {parameters}",
+        f"  * 'hint' = {hint}",
+        f"  * 'time_limit' = {time_limit}",
+        f"  * 'num_workers' = {num_workers}",
+        f"  * 'manifest' = {manifest}",
+        f"  * 'portfolio_size' = {portfolio_size}",
         "[ Env variables: ]",
         f"  * 'DATA_DIR' = {DATA_DIR}"
     ]
     print("\n".join(debug_log))
 
     # Define paths
+    # Note: Every worker of a portfolio writes its outputs into its own
+    #       directory (the scheduler picks the best one).
+    OUTPUT_DIR = DATA_DIR
+    worker_index = int(os.environ.get("BATCH_TASK_INDEX", 0))
+    if portfolio_size > 1:
+        OUTPUT_DIR = os.path.join(DATA_DIR, PORTFOLIO_DIR, str(worker_index))
+        os.makedirs(OUTPUT_DIR, exist_ok=True)
+
     input_jobs_data = os.path.join(DATA_DIR, jobs)
     input_parameters = os.path.join(DATA_DIR, parameters)
-    output_results_json = os.path.join(DATA_DIR, "results.json")
-    output_metrics_json = os.path.join(DATA_DIR, "metrics.json")
+    output_results_json = os.path.join(OUTPUT_DIR, "results.json")
+    output_metrics_json = os.path.join(OUTPUT_DIR, "metrics.json")
+    output_solution_json = os.path.join(OUTPUT_DIR, "solution.json")
+    output_summary_json = os.path.join(OUTPUT_DIR, "summary.json")
+    output_status_json = os.path.join(OUTPUT_DIR, "status.json")
+
+    try:
+        # Read parameters
+        parameters_as_str = open(input_parameters, "r").read()
+        parameters = json.loads(parameters_as_str)
+
+        # Read jobs
+        input_jobs_data_as_str = open(input_jobs_data, "r").read()
+        jobs_data = json.loads(input_jobs_data_as_str)
+
+        # Read the hint (a known solution in the `solution.json` format)
+        solution_hint = None
+        if hint is not None and os.path.exists(os.path.join(DATA_DIR, hint)):
+            solution_hint = json.loads(open(os.path.join(DATA_DIR, hint), "r").read())["jobs"]
+        phases["read_input"] = time.perf_counter() - phase_started_at
+
+        # Continue the search of a previous attempt (if the task is a retry)
+        # Note: Only the remaining part of the time limit is used.
+        checkpoint = Checkpoint(os.path.join(OUTPUT_DIR, CHECKPOINT_FILE_NAME))
+        checkpoint.start()
+
+        # Run the solver
+        # Note: Portfolio workers resume from the shared incumbents instead.
+        # Note: The checkpoint is stopped even if the solve fails (a worker
+        #       of a pool solves other scenarios in the same process then).
+        try:
+            if checkpoint.is_exhausted(time_limit):
+                print("The time limit has been used up by previous attempts.")
+                plotly_data, metrics, solution = [], {}, None
+            elif portfolio_size > 1:
+                plotly_data, metrics, solution = solve_with_portfolio(
+                    jobs_data, parameters["objective_function"],
+                    os.path.join(DATA_DIR, PORTFOLIO_DIR), worker_index, portfolio_size,
+                    hint=solution_hint, time_limit=checkpoint.remaining(time_limit),
+                    num_workers=num_workers, phases=phases)
+            else:
+                plotly_data, metrics, solution = solve_flexible_jobshop_problem(
+                    jobs_data, parameters["objective_function"],
+                    hint=checkpoint.hint or solution_hint,
+                    time_limit=checkpoint.remaining(time_limit), num_workers=num_workers,
+                    phases=phases, objective_lower_bound=checkpoint.lower_bound,
+                    on_solution=checkpoint.on_solution)
+        finally:
+            checkpoint.stop()
+        phase_started_at = time.perf_counter()
+
+        # Note: The search of a retry can end without a solution (e.g. there
+        #       is little time left), but a previous attempt has found one.
+        if solution is None and checkpoint.solution is not None:
+            print("Using the best solution of previous attempts.")
+            solution = checkpoint.solution
+            plotly_data, metrics = build_schedule(jobs_data, solution)
 
+        # Dump the solution
+        with open(output_results_json, "w") as output:
+            output.write(json.dumps(plotly_data))
 
-    # Read parameters
-    parameters_as_str = open(input_parameters, "r").read()
-    parameters = json.loads(parameters_as_str)
+        # Dump metrics
+        with open(output_metrics_json, "w") as outfile:
+            outfile.write(json.dumps(metrics, indent=4))
 
-    # Read jobs
-    input_jobs_data_as_str = open(input_jobs_data, "r").read()
-    jobs_data = json.loads(input_jobs_data_as_str)
+        # Dump the solution in a compact form (it can be used as a hint later)
+        if solution is not None:
+            with open(output_solution_json, "w") as outfile:
+                outfile.write(json.dumps(solution))
 
-    # Run the solver
-    plotly_data, metrics = solve_flexible_jobshop_problem(
-        jobs_data, parameters["objective_function"])
+            # Dump aggregates (the app shows an overview without loading all the tasks)
+            with open(output_summary_json, "w") as outfile:
+                outfile.write(json.dumps(summarize_schedule(jobs_data, solution)))
+        phases["write_output"] = time.perf_counter() - phase_started_at
 
-    # Dump the solution
-    with open(output_results_json, "w") as output:
-        output.write(json.dumps(plotly_data))
+    except Exception as error:
+        write_status_marker(output_status_json, "FAILED", started_at, error=repr(error),
+                            phases=phases)
+        raise
 
-    # Dump metrics
-    with open(output_metrics_json, "w") as outfile:
-        outfile.write(json.dumps(metrics, indent=4))
+    # Note: It has to be the last step - the marker means that all the other
+    #       files are ready to be read.
+    summary = {key: solution[key] for key in ("objective", "makespan")} if solution else {}
+    write_status_marker(output_status_json, "SUCCEEDED", started_at, metrics=metrics,
+                        phases=phases, solve_status=solution["status"] if solution else None,
+                        **summary)
 
-typer.run(main)
\ No newline at end of file
+if __name__ == "__main__":
+    typer.run(main)
@@ -0,0 +1,108 @@
+"""Portfolio solving: one scenario, many Batch tasks (workers).
+
+Every worker searches with a different seed, strategy and model variant.
+The search is split into rounds. After each round a worker publishes its
+best solution (an "incumbent") as a small file in the mounted bucket, and
+before each round it picks up the best incumbent of all workers - as a hint
+and as a bound (only better solutions are searched for then).
+
+The scheduler chooses the best worker's result once all of them finish.
+"""
+
+import os
+import json
+import time
+from solver import solve_flexible_jobshop_problem
+
+PORTFOLIO_DIR = "portfolio"
+
+# Number of times workers exchange their incumbents
+NUM_ROUNDS = 4
+
+# Strategies are assigned to workers round-robin (seeds are always different)
+STRATEGIES = [
+    {},
+    {"linearization_level": 2},
+    {"optimize_with_core": True},
+    {"randomize_search": True},
+]
+
+
+def _incumbent_path(portfolio_dir, worker_index):
+    return os.path.join(portfolio_dir, f"incumbent-{worker_index}.json")
+
+
+def read_best_incumbent(portfolio_dir, portfolio_size):
+    """The best solution published by any of the workers (or None)."""
+    best = None
+    for worker_index in range(portfolio_size):
+        try:
+            with open(_incumbent_path(portfolio_dir, worker_index), "r") as file:
+                incumbent = json.loads(file.read())
+        except (OSError, ValueError):
+            # Not published yet (or being written right now)
+            continue
+        if best is None or incumbent["objective"] < best["objective"]:
+            best = incumbent
+    return best
+
+
+def write_incumbent(portfolio_dir, worker_index, solution):
+    with open(_incumbent_path(portfolio_dir, worker_index), "w") as file:
+        file.write(json.dumps(solution))
+
+
+def solve_with_portfolio(jobs, objective, portfolio_dir, worker_index, portfolio_size,
+                         hint=None, time_limit=None, num_workers=None, phases=None):
+    """Runs a single worker of a portfolio. Returns the best solution found by
+    this worker (in the same format as `solve_flexible_jobshop_problem`).
+    """
+    os.makedirs(portfolio_dir, exist_ok=True)
+    num_rounds = NUM_ROUNDS if time_limit is not None else 1
+    deadline = time.monotonic() + float(time_limit or 0)
+    strategy = STRATEGIES[worker_index % len(STRATEGIES)]
+    best = None
+
+    for round_id in range(num_rounds):
+        incumbent = read_best_incumbent(portfolio_dir, portfolio_size)
+        if best is not None and (incumbent is None or best[2]["objective"] <= incumbent["objective"]):
+            incumbent = best[2]
+
+        round_time_limit = None
+        if time_limit is not None:
+            round_time_limit = max(1.0, (deadline - time.monotonic()) / (num_rounds - round_id))
+
+        # Note: Only better solutions than the incumbent are searched for once
+        #       the worker has a result of its own. Until then (e.g. in a retried
+        #       attempt, whose incumbent from the previous one is the best
+        #       known solution) the incumbent is just a hint, so the worker
+        #       always ends up with a result at least as good as it.
+        objective_bound = None
+        if incumbent is not None and best is not None:
+            objective_bound = incumbent["objective"]
+
+        round_phases = {}
+        parameters = dict(strategy, random_seed=worker_index + round_id * portfolio_size)
+        result = solve_flexible_jobshop_problem(
+            jobs, objective,
+            hint=incumbent["jobs"] if incumbent is not None else hint,
+            time_limit=round_time_limit, num_workers=num_workers, phases=round_phases,
+            parameters=parameters, objective_bound=objective_bound,
+            redundant_constraints=worker_index % 2 == 1)
+
+        if phases is not None:
+            for phase, duration in round_phases.items():
+                phases[phase] = phases.get(phase, 0) + duration
+
+        solution = result[2]
+        if solution is not None and (best is None or solution["objective"] < best[2]["objective"]):
+            best = result
+            write_incumbent(portfolio_dir, worker_index, solution)
+        print("Round %i: own best = %s, shared best = %s" % (
+            round_id, best[2]["objective"] if best else None,
+            incumbent["objective"] if incumbent else None))
+
+        if time_limit is not None and time.monotonic() >= deadline:
+            break
+
+    return best if best is not None else ([], {}, None)
@@ -25,10 +25,16 @@ jobs. This is called the makespan.
 
 # overloaded sum() clashes with pytype.
 
+import math
+import time
+import heapq
 import collections
 from datetime import date, timedelta
 from ortools.sat.python import cp_model
 
+# Number of jobs (the ones that finish last) listed in a schedule's summary
+MAX_SUMMARY_JOBS = 100
+
 
 # jobs = [
 #     [
@@ -49,11 +55,12 @@ from ortools.sat.python import cp_model
 # ]
 
 class SolutionPrinter(cp_model.CpSolverSolutionCallback):
-    """Print intermediate solutions."""
+    """Print intermediate solutions (and pass them to `on_solution` if given)."""
 
-    def __init__(self):
+    def __init__(self, on_solution=None):
         cp_model.CpSolverSolutionCallback.__init__(self)
         self.__solution_count = 0
+        self.__on_solution = on_solution
 
     def on_solution_callback(self):
         """Called at each new solution."""
@@ -62,6 +69,8 @@ class SolutionPrinter(cp_model.CpSolverSolutionCallback):
             % (self.__solution_count, self.WallTime(), self.ObjectiveValue())
         )
         self.__solution_count += 1
+        if self.__on_solution is not None:
+            self.__on_solution(self)
 
 
 def calculate_num_of_machines(jobs):
@@ -102,8 +111,140 @@ def calculate_metrics(data, input_jobs, input_num_machines):
     }
 
 
-def solve_flexible_jobshop_problem(jobs, objective: str = "makespan"):
-    """solve a small flexible jobshop problem."""
+def build_schedule(jobs, solution):
+    """Gantt chart's entries and metrics of a solution (in the `solution.json` format)."""
+    today = date.today()
+    raw_data = collections.defaultdict(list)
+    plotly_entries = []
+
+    for job_id, job_solution in enumerate(solution["jobs"]):
+        for task_id, (start_value, selected) in enumerate(job_solution):
+            duration, machine = jobs[job_id][task_id][selected]
+            raw_data[machine].append({
+                "job_id": job_id,
+                "start_value": start_value,
+                "duration": duration
+            })
+            plotly_entries.append({
+                "Task": f"Machine {machine}",
+                "Resource": f"Job {job_id}",
+                "Start": str(today + timedelta(days=start_value)),
+                "Finish": str(today + timedelta(days=(start_value + duration))),
+                "Hoverdata": f"TaskID: {task_id} (alterative route: {selected})"
+            })
+
+    return plotly_entries, calculate_metrics(raw_data, jobs, calculate_num_of_machines(jobs))
+
+
+def summarize_schedule(jobs, solution, num_buckets=50):
+    """Compact, pre-aggregated view of a schedule. Its size depends only on
+    the number of machines (not on the number of jobs or tasks).
+
+    * machines - utilization, number of tasks and idle gaps of every machine
+    * load - busy fraction of every machine in every time bucket (a heatmap)
+    * jobs - start and completion of the jobs that finish last (at most
+      `MAX_SUMMARY_JOBS`, they determine the makespan)
+    * num_jobs - number of all jobs
+    """
+    makespan = max(1, solution["makespan"])
+    bucket_size = makespan / num_buckets
+    intervals = collections.defaultdict(list)
+    job_rows = []
+
+    for job_id, job_solution in enumerate(solution["jobs"]):
+        job_start, job_end = None, 0
+        for task_id, (start_value, alt_id) in enumerate(job_solution):
+            duration, machine = jobs[job_id][task_id][alt_id]
+            intervals[machine].append((start_value, start_value + duration))
+            job_start = start_value if job_start is None else min(job_start, start_value)
+            job_end = max(job_end, start_value + duration)
+        job_rows.append({"job": f"Job {job_id}", "start": job_start or 0,
+                         "completion": job_end, "num_tasks": len(job_solution)})
+
+    machine_rows, load = [], []
+    for machine in sorted(intervals):
+        machine_intervals = sorted(intervals[machine])
+        busy = sum(end - start for start, end in machine_intervals)
+        gaps = [next_start - end for (_, end), (next_start, _)
+                in zip(machine_intervals, machine_intervals[1:]) if next_start > end]
+        machine_rows.append({
+            "machine": f"Machine {machine}",
+            "num_tasks": len(machine_intervals),
+            "busy": busy,
+            "utilization": round(busy / makespan, 3),
+            "idle_gaps": len(gaps),
+            "idle_gap_mean": round(sum(gaps) / len(gaps), 2) if gaps else 0,
+            "idle_gap_max": max(gaps, default=0),
+        })
+
+        buckets = [0.0] * num_buckets
+        for start, end in machine_intervals:
+            first, last = int(start // bucket_size), int(min(end / bucket_size, num_buckets - 1))
+            for bucket in range(first, last + 1):
+                bucket_start = bucket * bucket_size
+                overlap = min(end, bucket_start + bucket_size) - max(start, bucket_start)
+                buckets[bucket] += max(0.0, overlap)
+        load.append([round(busy_time / bucket_size, 3) for busy_time in buckets])
+
+    return {
+        "makespan": solution["makespan"],
+        "bucket_size": bucket_size,
+        "machines": machine_rows,
+        "load": load,
+        "jobs": heapq.nlargest(MAX_SUMMARY_JOBS, job_rows, key=lambda row: row["completion"]),
+        "num_jobs": len(job_rows),
+    }
+
+
+def add_solution_hint(model, jobs, hint, starts, presences):
+    """Hints the solver with a known (possibly partial) solution.
+
+    The hint has one entry per job: either None (the job is not hinted) or
+    a list of [start, alternative_id] pairs, one per task.
+    """
+    num_hinted_jobs = 0
+    for job_id, job_hint in enumerate(hint[:len(jobs)]):
+        if job_hint is None or len(job_hint) != len(jobs[job_id]):
+            continue
+
+        for task_id, (start_value, alt_id) in enumerate(job_hint):
+            task = jobs[job_id][task_id]
+            if not 0 <= alt_id < len(task):
+                continue
+            model.AddHint(starts[(job_id, task_id)], start_value)
+            if len(task) > 1:
+                for other_alt_id in range(len(task)):
+                    model.AddHint(presences[(job_id, task_id, other_alt_id)],
+                                  other_alt_id == alt_id)
+        num_hinted_jobs += 1
+
+    print("Hinted jobs = %i / %i" % (num_hinted_jobs, len(jobs)))
+    return num_hinted_jobs
+
+
+def solve_flexible_jobshop_problem(jobs, objective: str = "makespan", hint=None,
+                                   time_limit=None, num_workers=None, phases=None,
+                                   parameters=None, objective_bound=None,
+                                   redundant_constraints=False, objective_lower_bound=None,
+                                   on_solution=None):
+    """solve a small flexible jobshop problem.
+
+    If `phases` (a dict) is given, it's filled with durations (in seconds) of
+    building the model, the search and extracting the solution.
+
+    Portfolio workers (see `portfolio.py`) also use:
+    * parameters - extra CP-SAT parameters (e.g. a random seed)
+    * objective_bound - only solutions strictly better than that are searched for
+    * redundant_constraints - adds machines' load constraints (a model variant
+      that prunes more, but makes every search node slower)
+
+    Checkpoints (see `checkpoint.py`) use:
+    * objective_lower_bound - a bound proven by a previous attempt
+    * on_solution - called with every improving solution as
+      `on_solution(objective, bound, get_solution)`; `get_solution()` returns
+      it in the `solution.json` format (only within the call)
+    """
+    phase_started_at = time.perf_counter()
 
     num_jobs = len(jobs)
     all_jobs = range(num_jobs)
@@ -130,6 +271,7 @@ def solve_flexible_jobshop_problem(jobs, objective: str = "makespan"):
     presences = {}  # indexed by (job_id, task_id, alt_id).
     job_ends = []
     busy = []
+    machine_loads = collections.defaultdict(list)  # indexed by machine_id.
 
     # Scan the jobs and create the relevant variables and intervals.
     for job_id in all_jobs:
@@ -192,6 +334,7 @@ def solve_flexible_jobshop_problem(jobs, objective: str = "makespan"):
 
                     # Add the local interval to the right machine.
                     intervals_per_resources[task[alt_id][1]].append(l_interval)
+                    machine_loads[task[alt_id][1]].append(l_duration * l_presence)
 
                     # Store the presences for the solution.
                     presences[(job_id, task_id, alt_id)] = l_presence
@@ -200,6 +343,7 @@ def solve_flexible_jobshop_problem(jobs, objective: str = "makespan"):
                 model.AddExactlyOne(l_presences)
             else:
                 intervals_per_resources[task[0][1]].append(interval)
+                machine_loads[task[0][1]].append(duration)
                 presences[(job_id, task_id, 0)] = model.NewConstant(1)
 
         job_ends.append(previous_end)
@@ -214,21 +358,65 @@ def solve_flexible_jobshop_problem(jobs, objective: str = "makespan"):
     makespan = model.NewIntVar(0, horizon, "makespan")
     model.AddMaxEquality(makespan, job_ends)
 
+    # Redundant: no machine can be busy for longer than the makespan.
+    if redundant_constraints:
+        for machine_id in all_machines:
+            model.Add(sum(machine_loads[machine_id]) <= makespan)
+
+    objective_var = None
     if objective == "makespan":
+        objective_var = makespan
         model.Minimize(makespan)
     elif objective == "oee":
         oee = model.NewIntVar(0, horizon * num_machines, "oee")
         model.Add(oee == num_machines * makespan - sum(busy))
+        objective_var = oee
         model.Minimize(oee)
     else:
         print("Error. Incorrect objective name.")
 
-    # Solve model.
+    # Search only for solutions better than a known one (e.g. found by another worker).
+    if objective_bound is not None and objective_var is not None:
+        model.Add(objective_var <= int(objective_bound) - 1)
+    if objective_lower_bound is not None and objective_var is not None:
+        model.Add(objective_var >= math.ceil(objective_lower_bound))
+
+    # Start from a known solution (e.g. the best one found for a similar instance).
     solver = cp_model.CpSolver()
-    solution_printer = SolutionPrinter()
-    status = solver.Solve(model, solution_printer)
+    if hint is not None and add_solution_hint(model, jobs, hint, starts, presences):
+        # Note: Partial hints (e.g. some jobs were added) are usually infeasible as they are.
+        solver.parameters.repair_hint = True
+
+    # Note: The best solution found so far is kept if the time limit is reached
+    #       (it's set a bit below the Batch task's limit).
+    if time_limit is not None:
+        solver.parameters.max_time_in_seconds = float(time_limit)
+    if num_workers is not None:
+        solver.parameters.num_workers = int(num_workers)
+    for name, value in (parameters or {}).items():
+        setattr(solver.parameters, name, value)
 
-    raw_data = collections.defaultdict(list)
+    # Solve model.
+    model_built_at = time.perf_counter()
+    # Note: Reading all the values is expensive for big models, so it's done
+    #       only when the caller asks for the solution.
+    def _get_jobs(value):
+        return [[[value(starts[(job_id, task_id)]),
+                  next(alt_id for alt_id in range(len(jobs[job_id][task_id]))
+                       if value(presences[(job_id, task_id, alt_id)]))]
+                 for task_id in range(len(jobs[job_id]))]
+                for job_id in all_jobs]
+
+    def _on_solution(callback):
+        on_solution(callback.ObjectiveValue(), callback.BestObjectiveBound(), lambda: {
+            "objective": callback.ObjectiveValue(),
+            "makespan": callback.Value(makespan),
+            "jobs": _get_jobs(callback.Value)
+        })
+
+    solution_printer = SolutionPrinter(_on_solution if on_solution is not None else None)
+    status = solver.Solve(model, solution_printer)
+    search_finished_at = time.perf_counter()
 
     # Print final solution.
     for job_id in all_jobs:
@@ -244,12 +432,6 @@ def solve_flexible_jobshop_problem(jobs, objective: str = "makespan"):
                     machine = jobs[job_id][task_id][alt_id][1]
                     selected = alt_id
 
-            raw_data[machine].append({
-                "job_id": job_id,
-                "start_value": start_value,
-                "duration": duration
-            })
-
             print(
                 "  task_%i_%i starts at %i (alt %i, machine %i, duration %i)"
                 % (job_id, task_id, start_value, selected, machine, duration)
@@ -259,31 +441,18 @@ def solve_flexible_jobshop_problem(jobs, objective: str = "makespan"):
 
     plotly_entries = []
     metrics = {}
+    solution = None
 
     if status == cp_model.OPTIMAL or status == cp_model.FEASIBLE:
-        today = date.today()
-        for job_id in all_jobs:
-            print("Job %i:" % job_id)
-            for task_id in range(len(jobs[job_id])):
-                start_value = solver.Value(starts[(job_id, task_id)])
-                machine = -1
-                duration = -1
-                selected = -1
-                for alt_id in range(len(jobs[job_id][task_id])):
-                    if solver.Value(presences[(job_id, task_id, alt_id)]):
-                        duration = jobs[job_id][task_id][alt_id][0]
-                        machine = jobs[job_id][task_id][alt_id][1]
-                        selected = alt_id
-
-                plotly_entries.append({
-                    "Task": f"Machine {machine}",
-                    "Resource": f"Job {job_id}",
-                    "Start": str(today + timedelta(days=start_value)),
-                    "Finish": str(today + timedelta(days=(start_value + duration))),
-                    "Hoverdata": f"TaskID: {task_id} (alterative route: {selected})"
-                })
-
-        metrics = calculate_metrics(raw_data, jobs, num_machines)
+        # Note: The status tells if the solution is proven to be optimal (or
+        #       just the best one found within the time limit)
+        solution = {
+            "objective": solver.ObjectiveValue(),
+            "makespan": solver.Value(makespan),
+            "status": solver.StatusName(status),
+            "jobs": _get_jobs(solver.Value)
+        }
+        plotly_entries, metrics = build_schedule(jobs, solution)
 
     print("solve status: %s" % solver.StatusName(status))
     print("Optimal objective value: %i" % solver.ObjectiveValue())
@@ -292,4 +461,9 @@ def solve_flexible_jobshop_problem(jobs, objective: str = "makespan"):
     print("  - branches  : %i" % solver.NumBranches())
     print("  - wall time : %f s" % solver.WallTime())
 
-    return plotly_entries, metrics
\ No newline at end of file
+    if phases is not None:
+        phases["build_model"] = model_built_at - phase_started_at
+        phases["search"] = search_finished_at - model_built_at
+        phases["extract"] = time.perf_counter() - search_finished_at
+
+    return plotly_entries, metrics, solution
\ No newline at end of file
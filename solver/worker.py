@@ -0,0 +1,240 @@
+"""Worker mode: a long-running solver process that solves scenarios back to back.
+
+Small scenarios take a few seconds to solve, but a Batch job for each of
+them pays for a new VM, an image pull and cold imports (OR-Tools, pandas)
+every time. A worker pays for all of that once: it pulls scenario tasks
+from a queue and solves them in the same process until the queue stays
+empty for `idle_timeout` seconds.
+
+The queue is a directory (the scheduler's `pool/` prefix of the mounted
+bucket, or any local directory in tests):
+
+    tasks/<task_id>.json   - a scenario (`data_dir` + solver's options),
+                             written by the scheduler
+    claims/<task_id>       - a lease of the worker that solves the scenario
+                             (its id, attempt and heartbeat)
+
+A task is claimed by creating its claim file exclusively, so every task is
+solved by one worker at a time. The worker refreshes the claim's heartbeat
+while it solves the scenario. A claim that hasn't been refreshed for
+`CLAIM_LEASE` seconds (its worker has been preempted or killed) is taken
+over by another worker, up to `MAX_ATTEMPTS` times. Scenario's outputs
+(including `status.json`, which the scheduler watches for) are written as
+usual.
+"""
+
+import os
+import json
+import time
+import uuid
+import socket
+import threading
+import traceback
+import typer
+from datetime import datetime, timezone
+from main import main as solve_scenario, write_status_marker
+
+QUEUE_TASKS_DIR = "tasks"
+QUEUE_CLAIMS_DIR = "claims"
+
+# How often (in seconds) an empty queue is checked for new tasks
+POLL_INTERVAL = 2
+
+# How often (in seconds) a worker refreshes claims of its task, and after how
+# long without a refresh the claim is considered abandoned
+CLAIM_HEARTBEAT_INTERVAL = 30
+CLAIM_LEASE = 300
+
+# A task that has been abandoned this many times fails (e.g. it's too big
+# for workers' machines)
+MAX_ATTEMPTS = 3
+
+
+class FileQueue:
+
+    def __init__(self, root, worker_id=None):
+        self.root = root
+        self.worker_id = worker_id or f"{socket.gethostname()}-{uuid.uuid4().hex[:8]}"
+        self.tasks_dir = os.path.join(root, QUEUE_TASKS_DIR)
+        self.claims_dir = os.path.join(root, QUEUE_CLAIMS_DIR)
+        os.makedirs(self.tasks_dir, exist_ok=True)
+        os.makedirs(self.claims_dir, exist_ok=True)
+
+    def put(self, task_id, task):
+        """Adds a task (the scheduler writes task files to the bucket directly)."""
+        with open(os.path.join(self.tasks_dir, f"{task_id}.json"), "w") as file:
+            file.write(json.dumps(task))
+
+    def _claim_path(self, task_id):
+        return os.path.join(self.claims_dir, task_id)
+
+    def read_claim(self, task_id):
+        try:
+            with open(self._claim_path(task_id), "r") as file:
+                return json.loads(file.read())
+        except (OSError, ValueError):
+            # Not claimed (or the claim is being written right now)
+            return None
+
+    def _try_claim(self, task_id, attempt):
+        now = time.time()
+        claim = {"worker": self.worker_id, "attempt": attempt,
+                 "claimed_at": now, "heartbeat": now}
+        try:
+            descriptor = os.open(self._claim_path(task_id), os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            with os.fdopen(descriptor, "w") as file:
+                file.write(json.dumps(claim))
+        except OSError:
+            # Claimed by another worker (on the mounted bucket, the loser of
+            # a race can find out only when the file is flushed)
+            return False
+        # Note: The claim is read back, so a worker never solves a task that
+        #       has been claimed by another one in the meantime.
+        return (self.read_claim(task_id) or {}).get("worker") == self.worker_id
+
+    def _is_stale(self, claim):
+        return claim is not None and time.time() - claim["heartbeat"] > CLAIM_LEASE
+
+    def _take_over(self, task_id):
+        """Claims a task whose worker has stopped refreshing its claim."""
+        claim = self.read_claim(task_id)
+        if not self._is_stale(claim):
+            return None
+        # Note: Two workers can take over the same claim at once only if both
+        #       of them remove it before either creates the new one. The task
+        #       is solved twice then (with the same outputs).
+        try:
+            os.remove(self._claim_path(task_id))
+        except FileNotFoundError:
+            pass
+        attempt = claim.get("attempt", 1) + 1
+        print(f"Taking over {task_id} from {claim['worker']} (attempt {attempt})")
+        return attempt if self._try_claim(task_id, attempt) else None
+
+    def _read_task(self, task_id):
+        try:
+            with open(os.path.join(self.tasks_dir, f"{task_id}.json"), "r") as file:
+                return json.loads(file.read())
+        except (OSError, ValueError):
+            # Removed (e.g. the scenario has been cancelled) after the listing
+            self.complete(task_id)
+            return None
+
+    def claim(self):
+        """Claims the oldest unclaimed task (or an abandoned one if there are
+        no unclaimed tasks). Returns (task_id, task, attempt) or None.
+        """
+        try:
+            claimed = set(os.listdir(self.claims_dir))
+            names = sorted(os.listdir(self.tasks_dir),
+                           key=lambda name: os.path.getmtime(os.path.join(self.tasks_dir, name)))
+        except OSError:
+            # A task has been removed while listing - try again next time
+            return None
+        task_ids = [name[:-len(".json")] for name in names if name.endswith(".json")]
+
+        for task_id in task_ids:
+            if task_id in claimed or not self._try_claim(task_id, 1):
+                continue
+            task = self._read_task(task_id)
+            if task is not None:
+                return task_id, task, 1
+
+        for task_id in task_ids:
+            if task_id not in claimed:
+                continue
+            attempt = self._take_over(task_id)
+            if attempt is None:
+                continue
+            task = self._read_task(task_id)
+            if task is not None:
+                return task_id, task, attempt
+        return None
+
+    def _keep_alive(self, task_id, stopped):
+        while not stopped.wait(CLAIM_HEARTBEAT_INTERVAL):
+            claim = self.read_claim(task_id)
+            if claim is None or claim["worker"] != self.worker_id:
+                # Removed (the scenario has been cancelled) or taken over
+                return
+            claim["heartbeat"] = time.time()
+            try:
+                with open(self._claim_path(task_id), "w") as file:
+                    file.write(json.dumps(claim))
+            except OSError as error:
+                print("Cannot refresh the claim of %s: %r" % (task_id, error))
+
+    def heartbeat(self, task_id):
+        """Starts refreshing the task's claim. Returns an event that stops it."""
+        stopped = threading.Event()
+        threading.Thread(target=self._keep_alive, args=(task_id, stopped), daemon=True).start()
+        return stopped
+
+    def complete(self, task_id):
+        for path in (os.path.join(self.tasks_dir, f"{task_id}.json"), self._claim_path(task_id)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+def _get_solve_kwargs(options):
+    """Options of a task as arguments of `main` (they're strings, as on the command line)."""
+    kwargs = {"jobs": options["jobs"], "parameters": options["parameters"],
+              "hint": options.get("hint")}
+    if "time_limit" in options:
+        kwargs["time_limit"] = float(options["time_limit"])
+    if "num_workers" in options:
+        kwargs["num_workers"] = int(options["num_workers"])
+    return kwargs
+
+
+def run_worker(queue_dir: str = "pool", idle_timeout: float = 600, max_lifetime: float = None):
+    DATA_DIR = os.environ.get("DATA_DIR", "")
+    queue = FileQueue(os.path.join(DATA_DIR, queue_dir))
+    started_at = last_task_at = time.monotonic()
+    num_solved = 0
+    print(f"Worker {queue.worker_id} is waiting for tasks in {queue.root}")
+
+    while time.monotonic() - last_task_at < idle_timeout:
+        # Note: No new tasks are taken close to the end of the worker's
+        #       lifetime (Batch would kill it in the middle of a solve).
+        if max_lifetime is not None and time.monotonic() - started_at >= max_lifetime:
+            break
+
+        claimed = queue.claim()
+        if claimed is None:
+            time.sleep(POLL_INTERVAL)
+            continue
+
+        task_id, task, attempt = claimed
+        print(f"[ Task {task_id}: {task['data_dir']} (attempt {attempt}) ]")
+        data_dir = os.path.join(DATA_DIR, task["data_dir"])
+        if attempt > MAX_ATTEMPTS:
+            write_status_marker(os.path.join(data_dir, "status.json"), "FAILED",
+                                datetime.now(timezone.utc).isoformat(),
+                                error=f"Workers stopped in the middle of the solve "
+                                      f"{MAX_ATTEMPTS} times.")
+            queue.complete(task_id)
+            continue
+
+        # Note: `main` reads the scenario's directory from the environment
+        os.environ["DATA_DIR"] = data_dir
+        heartbeat = queue.heartbeat(task_id)
+        try:
+            solve_scenario(**_get_solve_kwargs(task["options"]))
+        except Exception:
+            # The FAILED marker has been written already, the worker goes on
+            traceback.print_exc()
+        finally:
+            heartbeat.set()
+            os.environ["DATA_DIR"] = DATA_DIR
+            queue.complete(task_id)
+        num_solved += 1
+        last_task_at = time.monotonic()
+
+    print(f"Worker {queue.worker_id} has solved {num_solved} scenarios and stops now.")
+
+
+if __name__ == "__main__":
+    typer.run(run_worker)